@@ -0,0 +1,113 @@
+import contextlib
+import io
+import json
+import random
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Union
+
+# benchmark the working tree rather than whatever copy of the package is installed
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from pydungeoncrawl.entities.board import Board  # noqa: E402
+from pydungeoncrawl.entities.characters import Party  # noqa: E402
+from pydungeoncrawl.utilities import base_maps  # noqa: E402
+from pydungeoncrawl.utilities.map_making import get_map  # noqa: E402
+
+try:
+    import importlib.resources as resources
+except ImportError:
+    import importlib_resources as resources  # type: ignore
+
+
+@dataclass
+class Benchmark:
+    name: str
+    setup: Callable[[], Callable[[], object]]
+    repeat: int
+    number: int
+
+
+BENCHMARKS: dict[str, Benchmark] = {}
+
+
+def benchmark(name: str, repeat: int = 5, number: int = 10):
+    '''
+    Register a benchmark. The decorated function is the setup: it is called once per
+    repeat and returns the zero-argument callable that gets timed `number` times.
+    '''
+    def decorator(setup: Callable[[], Callable[[], object]]):
+        BENCHMARKS[name] = Benchmark(name, setup, repeat, number)
+        return setup
+    return decorator
+
+
+def run(bench: Benchmark) -> dict[str, Union[float, int]]:
+    'time a benchmark; returns seconds per call for the fastest and median repeat'
+    timings = []
+    for _ in range(bench.repeat):
+        random.seed(0)
+        func = bench.setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            for _ in range(bench.number):
+                func()
+            timings.append((time.perf_counter() - start) / bench.number)
+    return {
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'repeat': bench.repeat,
+        'number': bench.number,
+    }
+
+
+##################
+# ~~ Fixtures ~~ #
+##################
+
+def map_names() -> list[str]:
+    'names of the maps bundled with the package'
+    return sorted(entry.name for entry in resources.files(base_maps).iterdir()
+                  if entry.name.endswith('.json'))
+
+
+def spawns(board: Board):
+    'party spawn squares and boss spawn square of a board'
+    party = [square for row in board.grid for square in row if square.symbol == '🟢']
+    boss = next(square for row in board.grid for square in row if square.symbol == '🔴')
+    return party, boss
+
+
+def make_party() -> Party:
+    from pydungeoncrawl.heroes import Guardian, Ranger, Shaman, Wizard
+    return Party(Guardian('Tank'), Shaman('Heals'), Wizard('Wiz'), Ranger('Bow'))
+
+
+def scripted_turn(party: Party, boss) -> None:
+    'a simple, deterministic party script used by the full-level benchmarks'
+    tank, healer, wizard, ranger = party.members
+    for member in (tank, wizard, ranger):
+        if member.distance_to(boss) > 1.5:
+            member.move_toward(boss)
+    tank.defensive_strike(boss)
+    wizard.frost_bolt(boss)
+    wizard.fire_bolt(boss)
+    wizard.magic_missile(boss)
+    ranger.frostfire_arrow(boss)
+    ranger.shoot(boss)
+    healer.poison_frost(boss)
+    if party.lowest_health.position != healer.position:
+        healer.regenerate(party.lowest_health)
+
+
+def load(map_name: str) -> Board:
+    return get_map(map_name)
+
+
+def dump(results: dict, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf8') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
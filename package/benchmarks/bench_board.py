@@ -0,0 +1,33 @@
+from pydungeoncrawl.bosses import Golem
+
+from _harness import benchmark, load, make_party, map_names, spawns
+
+
+def _board_tick(map_name: str):
+    def setup():
+        board = load(map_name)
+        party_squares, boss_square = spawns(board)
+        for pawn, square in zip(make_party(), party_squares):
+            pawn._position = square.position
+            board.place(pawn, square.position)
+        boss = Golem()
+        boss._position = boss_square.position
+        board.place(boss, boss_square.position)
+        return board._tick
+    return setup
+
+
+for _name in map_names():
+    benchmark(f'board.tick.{_name[:-5]}', number=20)(_board_tick(_name))
+
+
+def _radius(radius: int):
+    def setup():
+        board = load('river_ford.json')
+        centre = (board.width // 2, board.height // 2)
+        return lambda: board.get_squares_in_radius(centre, radius)
+    return setup
+
+
+for _radius_size in (1, 3, 8):
+    benchmark(f'board.squares_in_radius.{_radius_size}', number=100)(_radius(_radius_size))
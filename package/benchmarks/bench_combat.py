@@ -0,0 +1,43 @@
+from pydungeoncrawl.bosses import Golem
+from pydungeoncrawl.buffs import Reflect, Toughness
+from pydungeoncrawl.debuffs import ExposeWeakness, Frailty, MagicVulnerability, Poison
+from pydungeoncrawl.heroes import Guardian
+
+from _harness import benchmark
+
+
+def _loaded_target() -> Guardian:
+    'a tank carrying a buff/debuff load typical of a boss fight'
+    target = Guardian('Tank')
+    target.health_max = target._health = 10 ** 9
+    target.effects.add_stacks(Toughness, stacks=10, duration=float('inf'))
+    target.effects.add_stacks(ExposeWeakness, stacks=6, duration=float('inf'))
+    target.effects.add_stacks(Frailty, stacks=4, duration=float('inf'))
+    target.effects.add_stacks(MagicVulnerability, stacks=3)
+    target.effects.add(Poison(target, duration=float('inf')))
+    return target
+
+
+@benchmark('combat.take_damage.physical', number=200)
+def take_damage_physical():
+    target = _loaded_target()
+    boss = Golem()
+    return lambda: target._take_damage(boss, 50, 'physical', ability=True, ability_name='Attack')
+
+
+@benchmark('combat.take_damage.reflect', number=200)
+def take_damage_reflect():
+    target = _loaded_target()
+    target.effects.add(Reflect(float('inf')))
+    boss = Golem()
+    boss.health_max = boss._health = 10 ** 9
+    return lambda: target._take_damage(boss, 50, 'physical', ability=True, ability_name='Attack')
+
+
+@benchmark('combat.damage_report.1000', number=20)
+def damage_report():
+    target = _loaded_target()
+    boss = Golem()
+    for _ in range(1000):
+        target._take_damage(boss, 50, 'physical', ability=True, ability_name='Attack')
+    return target.damage_report
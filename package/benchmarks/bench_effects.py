@@ -0,0 +1,40 @@
+from pydungeoncrawl.buffs import Might, Toughness
+from pydungeoncrawl.debuffs import ExposeWeakness, Frailty
+from pydungeoncrawl.entities.effects import Effects
+
+from _harness import benchmark
+
+STACKS = 1000
+
+
+@benchmark('effects.add_stacks.1000')
+def add_stacks():
+    def func():
+        effects = Effects()
+        effects.add_stacks(Might, stacks=STACKS, duration=10)
+    return func
+
+
+def _loaded() -> Effects:
+    effects = Effects()
+    for constructor in (Might, Toughness, Frailty, ExposeWeakness):
+        effects.add_stacks(constructor, stacks=STACKS // 4, duration=float('inf'))
+    return effects
+
+
+@benchmark('effects.count.1000', number=100)
+def count():
+    effects = _loaded()
+    return lambda: effects.count('Toughness')
+
+
+@benchmark('effects.marquis.1000', number=20)
+def marquis():
+    effects = _loaded()
+    return lambda: effects._marquis
+
+
+@benchmark('effects.tick.1000', number=50)
+def tick():
+    effects = _loaded()
+    return effects._tick
@@ -0,0 +1,27 @@
+import inspect
+
+from pydungeoncrawl import bosses
+from pydungeoncrawl.levels import ForestPath
+
+from _harness import benchmark, make_party, scripted_turn
+
+MAX_TURNS = 100
+
+
+def _full_level(boss_class):
+    def setup():
+        def func():
+            party = make_party()
+            boss = boss_class()
+            level = ForestPath(party=party, boss=boss, show_board=False, tick_speed=0)
+            for turn in level:
+                if turn > MAX_TURNS:
+                    break
+                scripted_turn(party, boss)
+        return func
+    return setup
+
+
+for _name, _boss in inspect.getmembers(bosses, inspect.isclass):
+    if issubclass(_boss, bosses.Boss) and not inspect.isabstract(_boss):
+        benchmark(f'level.{_name}', repeat=3, number=1)(_full_level(_boss))
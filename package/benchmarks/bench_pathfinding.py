@@ -0,0 +1,29 @@
+from pydungeoncrawl.bosses import Golem
+from pydungeoncrawl.entities.board import Board
+
+from _harness import benchmark, load, map_names, spawns
+
+
+def _astar_on_map(map_name: str):
+    def setup():
+        board = load(map_name)
+        party, boss_square = spawns(board)
+        boss = Golem()
+        return lambda: boss._astar(board, boss_square.position, party[0].position)
+    return setup
+
+
+for _name in map_names():
+    benchmark(f'astar.map.{_name[:-5]}', number=5)(_astar_on_map(_name))
+
+
+def _astar_on_empty(size: int):
+    def setup():
+        board = Board(grid_size=size)
+        boss = Golem()
+        return lambda: boss._astar(board, (0, 0), (size - 1, size - 1))
+    return setup
+
+
+for _size in (16, 32, 64):
+    benchmark(f'astar.empty.{_size}x{_size}', number=3)(_astar_on_empty(_size))
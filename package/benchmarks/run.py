@@ -0,0 +1,72 @@
+'''
+Run the engine benchmarks and compare them against a stored JSON baseline.
+
+    python benchmarks/run.py --save            # record a new baseline
+    python benchmarks/run.py                   # compare against it
+    python benchmarks/run.py -k astar -t 0.5   # only A*, fail past +50%
+
+Exits with status 1 when any benchmark is slower than the baseline by more
+than the threshold.
+'''
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from _harness import BENCHMARKS, dump, run
+
+import bench_board  # noqa: F401
+import bench_combat  # noqa: F401
+import bench_effects  # noqa: F401
+import bench_levels  # noqa: F401
+import bench_pathfinding  # noqa: F401
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / 'baselines' / 'baseline.json'
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-k', '--filter', default='', help='only run benchmarks whose name contains this text')
+    parser.add_argument('-b', '--baseline', type=Path, default=DEFAULT_BASELINE, help='baseline JSON file')
+    parser.add_argument('-t', '--threshold', type=float, default=0.25,
+                        help='allowed slowdown over the baseline as a fraction (default 0.25)')
+    parser.add_argument('--save', action='store_true', help='write the results as the new baseline')
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if args.baseline.exists() and not args.save:
+        with open(args.baseline, encoding='utf8') as file:
+            baseline = json.load(file)
+
+    results = {}
+    regressions = []
+    for name, bench in sorted(BENCHMARKS.items()):
+        if args.filter not in name:
+            continue
+        result = results[name] = run(bench)
+        line = f"{name:<40} {result['min'] * 1e3:>10.3f} ms"
+        if name in baseline:
+            ratio = result['min'] / baseline[name]['min']
+            line += f"  {ratio:>6.2f}x baseline"
+            if ratio > 1 + args.threshold:
+                regressions.append(name)
+                line += '  REGRESSED'
+        print(line, flush=True)
+
+    if args.save:
+        # keep baselines for benchmarks that weren't selected by --filter
+        if args.baseline.exists():
+            with open(args.baseline, encoding='utf8') as file:
+                results = {**json.load(file), **results}
+        dump(results, args.baseline)
+        print(f"saved baseline to {args.baseline}")
+        return 0
+
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,261 @@
+'''
+Measure how the engine's core operations scale and fit an empirical
+complexity exponent to each of them.
+
+Each sweep times one operation at increasing sizes (board side, effect
+stacks, history length, pawn count), fits `time ~ size ** k` by least squares
+on a log-log scale, and compares `k` against the exponent the operation is
+expected to have. Hidden quadratic behaviour shows up as a fitted exponent
+well above the expected one.
+
+    python benchmarks/scaling.py
+    python benchmarks/scaling.py -k astar --budget 5 --json scaling.json
+
+Exits with status 1 when any fitted exponent is above its expected value by
+more than the tolerance.
+'''
+import argparse
+import contextlib
+import io
+import json
+import math
+import random
+import sys
+import time
+from dataclasses import dataclass
+from typing import Callable, Sequence
+
+import _harness  # noqa: F401  (puts the working tree on sys.path)
+
+from pydungeoncrawl.bosses import Golem
+from pydungeoncrawl.buffs import Might, Toughness
+from pydungeoncrawl.entities.board import Board
+from pydungeoncrawl.entities.effects import Effects
+from pydungeoncrawl.entities.pawn import Pawn
+from pydungeoncrawl.utilities.location import Point
+
+BOARD_SIZES = (20, 40, 80, 160, 320, 500)
+STACK_DEPTHS = (1, 10, 30, 100, 300, 1000)
+HISTORY_LENGTHS = (10, 100, 1000, 10_000)
+PAWN_COUNTS = (1, 4, 16, 64, 256)
+
+
+@dataclass
+class Sweep:
+    name: str
+    sizes: Sequence[int]
+    setup: Callable[[int], Callable[[], object]]
+    expected: float
+
+
+SWEEPS: list[Sweep] = []
+
+
+def sweep(name: str, sizes: Sequence[int], expected: float):
+    'register a setup function that builds the operation to time for a given size'
+    def decorator(setup: Callable[[int], Callable[[], object]]):
+        SWEEPS.append(Sweep(name, sizes, setup, expected))
+        return setup
+    return decorator
+
+
+##################
+# ~~ Fixtures ~~ #
+##################
+
+def _attacker() -> Golem:
+    boss = Golem()
+    boss.health_max = boss._health = 10 ** 9
+    return boss
+
+
+def _target(stacks: int = 0) -> Pawn:
+    target = Pawn('Target', (0, 0), 10 ** 9)
+    target.effects.add_stacks(Toughness, stacks=stacks, duration=float('inf'))
+    return target
+
+
+def _scatter(board: Board, count: int) -> list[Pawn]:
+    'place `count` pawns on random free squares of the board'
+    rng = random.Random(count)
+    pawns = []
+    while len(pawns) < count:
+        point = Point(rng.randrange(board.width), rng.randrange(board.height))
+        pawn = Pawn(f'Pawn {len(pawns)}', point, 100)
+        if board.place(pawn, point) == 'success':
+            pawns.append(pawn)
+    return pawns
+
+
+################
+# ~~ Sweeps ~~ #
+################
+
+@sweep('astar.board_size', BOARD_SIZES, expected=1)
+def astar(size: int):
+    board = Board(grid_size=size)
+    boss = Golem()
+    return lambda: boss._astar(board, (0, 0), (size - 1, size - 1))
+
+
+@sweep('board.tick.board_size', BOARD_SIZES, expected=2)
+def board_tick(size: int):
+    board = Board(grid_size=size)
+    _scatter(board, 4)
+    return board._tick
+
+
+@sweep('board.nearest_player.board_size', BOARD_SIZES, expected=2)
+def nearest_player(size: int):
+    board = Board(grid_size=size)
+    origin = Pawn('Origin', (size // 2, size // 2), 100)
+    board.place(origin, origin.position)
+    board.place(Pawn('Far', (size - 1, size - 1), 100), Point(size - 1, size - 1))
+    return lambda: board.get_nearest_player_to(origin)
+
+
+@sweep('board.tick.pawns', PAWN_COUNTS, expected=1)
+def board_tick_pawns(count: int):
+    board = Board(grid_size=50)
+    _scatter(board, count)
+    return board._tick
+
+
+@sweep('effects.tick.stacks', STACK_DEPTHS, expected=1)
+def effects_tick(stacks: int):
+    effects = Effects()
+    effects.add_stacks(Toughness, stacks=stacks, duration=float('inf'))
+    return effects._tick
+
+
+@sweep('effects.count.stacks', STACK_DEPTHS, expected=1)
+def effects_count(stacks: int):
+    effects = Effects()
+    effects.add_stacks(Toughness, stacks=stacks, duration=float('inf'))
+    return lambda: effects.count('Toughness')
+
+
+@sweep('effects.remove_one.stacks', STACK_DEPTHS, expected=1)
+def effects_remove_one(stacks: int):
+    effects = Effects()
+    effects.add_stacks(Toughness, stacks=stacks, duration=float('inf'))
+    last = Might(float('inf'))
+    effects.add(last)
+
+    def func():
+        effects.remove_one(last)
+        effects.add(last)
+    return func
+
+
+@sweep('pawn.take_damage.stacks', STACK_DEPTHS, expected=1)
+def take_damage(stacks: int):
+    target = _target(stacks)
+    boss = _attacker()
+
+    def func():
+        target._take_damage(boss, 50, 'physical', ability=True, ability_name='Attack')
+        target.action_history.clear()
+    return func
+
+
+@sweep('pawn.damage_report.history', HISTORY_LENGTHS, expected=1)
+def damage_report(length: int):
+    target = _target()
+    boss = _attacker()
+    for _ in range(length):
+        target._take_damage(boss, 1, 'physical', ability=True, ability_name='Attack')
+    return target.damage_report
+
+
+###################
+# ~~ Measuring ~~ #
+###################
+
+def measure(func: Callable[[], object], min_time: float = 0.02, repeat: int = 3) -> float:
+    'seconds per call, from the fastest of `repeat` runs of at least `min_time` seconds each'
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed == 0 else max(2, int(min_time / elapsed) + 1)
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def fit_exponent(sizes: Sequence[int], times: Sequence[float]) -> float:
+    'least-squares slope of log(time) against log(size)'
+    xs = [math.log(s) for s in sizes]
+    ys = [math.log(t) for t in times]
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    variance = sum((x - mean_x) ** 2 for x in xs)
+    if variance == 0:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / variance
+
+
+def run_sweep(sweep: Sweep, budget: float) -> dict:
+    'time a sweep, stopping early once a single call takes longer than `budget` seconds'
+    sizes, times = [], []
+    for size in sweep.sizes:
+        random.seed(0)
+        func = sweep.setup(size)
+        with contextlib.redirect_stdout(io.StringIO()):
+            seconds = measure(func)
+        sizes.append(size)
+        times.append(seconds)
+        if seconds > budget:
+            break
+    return {
+        'sizes': sizes,
+        'seconds': times,
+        'exponent': fit_exponent(sizes, times) if len(sizes) > 1 else float('nan'),
+        'expected': sweep.expected,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-k', '--filter', default='', help='only run sweeps whose name contains this text')
+    parser.add_argument('--budget', type=float, default=2.0,
+                        help='stop a sweep once one call takes longer than this many seconds (default 2)')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='allowed excess of the fitted exponent over the expected one (default 0.5)')
+    parser.add_argument('--json', default='', help='write the measurements to this JSON file')
+    args = parser.parse_args(argv)
+
+    results = {}
+    failures = []
+    for sweep in SWEEPS:
+        if args.filter not in sweep.name:
+            continue
+        result = results[sweep.name] = run_sweep(sweep, args.budget)
+        points = '  '.join(f"{size}:{seconds * 1e3:.3g}ms" for size, seconds in zip(result['sizes'], result['seconds']))
+        line = f"{sweep.name:<34} k={result['exponent']:5.2f} (expected {sweep.expected:g})"
+        if result['exponent'] > sweep.expected + args.tolerance:
+            failures.append(sweep.name)
+            line += '  SUPERLINEAR'
+        print(f"{line}\n    {points}", flush=True)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf8') as file:
+            json.dump(results, file, indent=2)
+
+    if failures:
+        print(f"{len(failures)} sweep(s) scale worse than expected: {', '.join(failures)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,27 +1,31 @@
-import time
+import asyncio
+import inspect
+import math
 import random
-import os
-import sys
-
-try:
-    from IPython.display import clear_output
-except ModuleNotFoundError:
-    print("IPython not found, defaulting to system clear-screen command to clear output.",
-    "This causes the game to flicker in most cases; for the best experience use Jupyter Notebook or Jupyter Lab.", file=sys.stderr)
-    def clear_output(wait: bool=False):
-        if not wait:
-            os.system('cls' if os.name == 'nt' else 'clear')
-        else:
-            sys.stdout.write('\b'*5000)
+import time
+from typing import Any, AsyncIterator, NamedTuple
 
-from .entities.board import Board
+from .entities.board import Board, Square
 from .entities.characters import Party
-from .entities.pawn import Pawn
+from .entities.pawn import Action, Pawn
 
 from .utilities.location import Point
+from .utilities.profiling import Profile
+from .utilities.rendering import RenderScheduler, default_renderer
 
 from .bosses import Boss
 
+class LevelSnapshot(NamedTuple):
+    'the mutable state of a level at the end of a turn; see `Level.snapshot()`'
+    level: 'Level'
+    turn_count: int
+    pawns: tuple
+    board: dict
+    rng: Any
+    started: bool
+    over: bool
+
+
 class Level:
     board: Board
     party: Party
@@ -29,11 +33,8 @@ class Level:
     turn_count: int
 
     def __init__(self, board: Board, party: Party, boss: Boss, show_board: bool = True, tick_speed: float = 0.25):
-        party_starty = [square
-                        for row in board.grid
-                        for square in row
-                        if square.symbol == '🟢']
-        boss_starty = [square for row in board.grid for square in row if square.symbol == '🔴'][0]
+        party_starty = board.find_symbol('🟢')
+        boss_starty = board.find_symbol('🔴')[0]
         
         for pawn, square in zip(party, party_starty):
             pawn._position = square.position
@@ -50,6 +51,24 @@ class Level:
         self.turn_count = 0
         self.show_board = show_board
         self.tick_speed = tick_speed
+        # redraws only what changed in a terminal; see `utilities.rendering`
+        self.renderer = default_renderer()
+        # which turns get drawn, and how long to wait between them
+        self.scheduler = RenderScheduler()
+        # set to a `utilities.recording.Recorder` to record the fight
+        self.recorder = None
+        # set by `utilities.replay.InputRecorder` to record the party's inputs
+        self.input_recorder = None
+
+        # the first engine turn has run / the game-over turn has run
+        self._started = False
+        self._over = False
+
+        # off until `level.profile.enable()` is called
+        self.profile = Profile()
+        for pawn in self.party:
+            pawn._profile = self.profile
+        self.boss._profile = self.profile
         
         # place the pawns
         for pawn in self.party:
@@ -62,54 +81,368 @@ class Level:
             if result != 'success':
                 pawn._revert_position(result)
 
+    def snapshot(self) -> LevelSnapshot:
+        '''
+        Save the mutable state of the fight: every pawn's position, health, facing,
+        cooldowns and effects (with their durations), the boss's mechanic counters,
+        the squares changed so far, the turn count, the RNG state and whether the
+        fight has started or ended.
+
+        Only what changed is copied, so this is cheap enough to call at every node
+        of a search. Taking the first snapshot starts the board's change journal, so
+        don't mix these with `board.snapshot()`/`board.restore()`.
+        '''
+        return LevelSnapshot(self, self.turn_count, tuple(pawn._snapshot() for pawn in (*self.party, self.boss)),
+                             self.board._changes(), random.getstate(), self._started, self._over)
+
+    def restore(self, snap: LevelSnapshot) -> None:
+        'put the fight back the way it was when `snap` was taken; a snapshot can be restored any number of times'
+        if snap.level is not self:
+            raise ValueError("The snapshot was taken from a different level")
+        self.turn_count = snap.turn_count
+        for pawn, state in zip((*self.party, self.boss), snap.pawns):
+            pawn._restore(state)
+        self.board._revert_to(snap.board)
+        random.setstate(snap.rng)
+        self._started, self._over = snap.started, snap.over
+
     @property
     def _marquis(self):
         return f"~~~~~~ TURN {self.turn_count:<4}~~~~~~\n{self.party._marquis}\n{'_'*80}\n{self.boss._marquis}\n{(self.boss.name + ': ' + self.boss.telegraph) if self.boss.telegraph else ''}"
 
-    def __iter__(self):
-        while self.party.is_alive and self.boss.is_alive:
+    def _engine_turn(self, lap: int, render: bool = True, wait: bool = True) -> int:
+        'the engine half of a turn: movement, the boss, and every tick, up to the next player turn'
+        profile = self.profile
+        self._started = True
 
-            # check movements
-            for player in self.party:
-                self.move(player, player.position)
-            
-            if self.turn_count:
-                self.boss._tick()
+        # check movements
+        for player in self.party:
+            self.move(player, player.position)
+        lap = profile.lap('party_move', lap)
+        
+        if self.turn_count:
+            idle = self.boss._idle_turns(self.party, self.board) > 0
+            self.boss._tick()
+            lap = profile.lap('boss_tick', lap)
+            if not idle:
                 self.boss._tick_logic(self.party, self.board)
-                self.move(self.boss, self.boss.position)
-                self.boss._post_tick()
-            else:
-                self.boss._post_tick()
+            lap = profile.lap('boss_logic', lap)
+            self.move(self.boss, self.boss.position)
+            lap = profile.lap('boss_move', lap)
+            self.boss._post_tick()
+        else:
+            self.boss._post_tick()
+        lap = profile.lap('boss_post_tick', lap)
 
-            # send tick to party, boss
-            self.party._tick()
-            self.board._tick()
+        # send tick to party, boss
+        self.party._tick()
+        lap = profile.lap('party_tick', lap)
+        self.board._tick()
+        lap = profile.lap('board_tick', lap)
 
-            self.turn_count += 1
+        self.turn_count += 1
+        if self.recorder is not None:
+            self.recorder.record(self)
 
-            if self.show_board:
-                clear_output(wait=True)
-                print(self)
-                time.sleep(self.tick_speed)
-            self.party._post_tick()
+        if render and self.show_board:
+            self.scheduler.render(self)
+            lap = profile.lap('render', lap)
+            if wait:
+                self.scheduler.wait(self.tick_speed)
+                lap = profile.lap('sleep', lap)
+        self.party._post_tick()
+        lap = profile.lap('party_post_tick', lap)
+        if profile.enabled:
+            profile.turns += 1
+        return lap
 
-            # player turns happen here
-            yield self.turn_count
-        
-        # game over
+    def _game_over(self, render: bool = True) -> None:
+        self._over = True
         for player in self.party:
             self.move(player, player.position)
         self.boss._tick()
         self.party._tick()
         self.board._tick()
+        if self.recorder is not None:
+            self.recorder.record(self)
+            self.recorder.close()
         
-        clear_output(wait=True)
-        print(self)
+        if render:
+            self.scheduler.finish(self)
 
         self.party._post_tick()
+
+    def __iter__(self):
+        profile = self.profile
+        while self.party.is_alive and self.boss.is_alive:
+            lap = self._engine_turn(profile.clock())
+
+            # player turns happen here
+            inputs = self.input_recorder
+            if inputs is not None:
+                inputs._begin_player_turn(self)
+            yield self.turn_count
+            if inputs is not None:
+                inputs._end_player_turn(self)
+            profile.lap('player_turns', lap)
         
+        self._game_over()
+        yield self.turn_count
+
+    async def aiter(self, decide: Any, deadline: float | None = None) -> AsyncIterator[int]:
+        '''
+        Play the fight on an event loop, awaiting every hero's decision at once:
+
+            async for turn in level.aiter(decide, deadline=2.0):
+                ...
+
+        `decide` is a callable `decide(hero, level)`, or one per hero (a sequence
+        in `party.members` order, or a dict keyed by hero or hero name). Each
+        returns, or is a coroutine that returns, the hero's action for the turn in
+        any form `step()` accepts; only living heroes are asked. The decisions run concurrently, so a turn takes
+        as long as the slowest one, not their sum. A hero that hasn't decided
+        `deadline` seconds into the turn forfeits it: its decision is cancelled and
+        a failed action is logged. The actions are then played in party order and
+        the turn is yielded, so the loop body can act too, as with `for turn in
+        level`. Pacing (`tick_speed`) sleeps without blocking the loop.
+        '''
+        profile = self.profile
+        deciders = self._pairs(decide) if not callable(decide) else [(hero, decide) for hero in self.party.members]
+        while self.party.is_alive and self.boss.is_alive:
+            lap = self._engine_turn(profile.clock(), wait=False)
+            if self.show_board:
+                await self.scheduler.wait_async(self.tick_speed)
+                lap = profile.lap('sleep', lap)
+
+            inputs = self.input_recorder
+            if inputs is not None:
+                inputs._begin_player_turn(self)
+            end = None if deadline is None else time.perf_counter() + deadline
+            living = [(hero, fn) for hero, fn in deciders if hero.is_alive]
+            actions = await asyncio.gather(*(self._decision(hero, fn, end) for hero, fn in living))
+            self._play([(hero, action) for (hero, _), action in zip(living, actions)])
+            yield self.turn_count
+            if inputs is not None:
+                inputs._end_player_turn(self)
+            profile.lap('player_turns', lap)
+
+        self._game_over()
         yield self.turn_count
 
+    async def _decision(self, hero: Pawn, decide: Any, end: float | None) -> Any:
+        'the action `decide` picks for `hero`, or None if it misses the deadline'
+        result = decide(hero, self)
+        if not inspect.isawaitable(result):
+            return result
+        try:
+            return await asyncio.wait_for(result, None if end is None else max(0.0, end - time.perf_counter()))
+        except asyncio.TimeoutError:
+            hero.action_history.append(
+                Action(
+                    turn=hero._turn,
+                    type='ability',
+                    action_name='decide',
+                    actor=hero,
+                    target=None,
+                    failed=True,
+                    failed_reason=f"{hero.name} ran out of time!"
+                )
+            )
+            return None
+
+    #############################
+    # ~~ Search and rollouts ~~ #
+    #############################
+
+    def fork(self) -> 'Level':
+        '''
+        A copy of the fight that can be played forward (with `step()` or by
+        iterating it) without changing this one.
+
+        Pawns, their effects and the party are copied; equipment, the map and
+        everything else that doesn't change during a fight is shared. The board is
+        copy-on-write: the fork only copies squares as it looks at them, so forking
+        costs about as much as the number of squares that have changed. The fork
+        doesn't draw, record, or have a profile of its own turned on, and it uses
+        the global `random` like the level does; seed it for repeatable rollouts.
+        '''
+        memo: dict[int, Any] = {}
+        pawns = (*self.party, self.boss)
+        for pawn in pawns:
+            memo[id(pawn)] = pawn.__class__.__new__(pawn.__class__)
+
+        clone = self.__class__.__new__(self.__class__)
+        clone.__dict__.update(self.__dict__)
+        clone.party = self.party._fork(memo)
+        clone.boss = self.boss._fork(memo)  # type: ignore[assignment]
+        clone.board = self.board._fork(memo)
+        clone.show_board = False
+        clone.tick_speed = 0
+        clone.renderer = default_renderer()
+        clone.scheduler = RenderScheduler()
+        clone.recorder = None
+        clone.input_recorder = None
+        clone.profile = Profile()
+        for pawn in (*clone.party, clone.boss):
+            pawn._profile = clone.profile
+        return clone
+
+    def step(self, actions: Any = None) -> bool:
+        '''
+        Play one turn without drawing anything: the party's `actions`, then the
+        boss and the ticks, up to the next player turn. Returns False once either
+        side is dead (the game-over turn has run by then); stepping a finished
+        fight raises ValueError. On a level that hasn't started, the first engine
+        turn runs before the actions.
+
+        `actions` is a sequence with one entry per hero (in `party.members`
+        order), or a dict keyed by hero or hero name. Each entry is None, a
+        callable that takes the hero, an `(ability_name, *args)` tuple (or just the
+        name), or a list of those. Pawns, the party, the board and squares in the
+        arguments may come from the level this one was forked from; they're
+        swapped for this level's own (pawns by name, squares by position).
+        '''
+        self._begin_steps()
+        self._act(actions)
+        return self._end_step()
+
+    def advance(self, n: int, policy: Any = None) -> int:
+        '''
+        Play up to `n` turns the way `step()` does, asking `policy(hero, level)`
+        for each living hero's action every turn, in party order. The policy can
+        act on the hero itself and return None, or return an action in any form
+        `step()` takes. Stops early when either side dies; returns the number of
+        turns played.
+        '''
+        self._begin_steps()
+        members = self.party.members
+        played = 0
+        while played < n:
+            if policy is not None:
+                for hero in members:
+                    if hero.is_alive:
+                        action = policy(hero, self)
+                        if action is not None:
+                            self._play([(hero, action)])
+            played += 1
+            if not self._end_step():
+                break
+        return played
+
+    def fast_forward(self, until: int | None = None) -> int:
+        '''
+        Skip over the coming turns in which nothing happens but ticking: the party
+        doesn't move or act, the boss's logic has nothing to do, nobody stands in
+        fire or lava and no effect has a tick hook. DoTs and HoTs, effect durations
+        and cooldowns are advanced by the whole stretch at once (the DoT and HoT
+        ticks still go into `action_history`, turn by turn).
+
+        Stops before the first turn where something would happen: an effect
+        expiring, a pawn dying or healing up to max health, or the boss's next
+        mechanic; and at turn `until` at the latest (which is needed when nothing
+        would ever happen). Call it at a player turn before anyone acts, instead
+        of stepping turns with no actions. Returns the number of turns skipped,
+        which is 0 when the next turn isn't quiet. The skipped turns aren't drawn
+        or recorded.
+        '''
+        self._begin_steps()
+        pawns = (*self.party, self.boss)
+        turns = self.boss._idle_turns(self.party, self.board)
+        if until is not None:
+            turns = min(turns, until - self.turn_count)
+        for pawn in pawns:
+            if turns <= 0:
+                return 0
+            square = self.board.at(pawn.position)
+            if square is not None and square.occupied and (square.is_burning or square.is_lava):
+                return 0
+            turns = min(turns, pawn._quiet_turns())
+        if turns == math.inf:
+            raise ValueError("Nothing is going to happen without the party; pass `until`")
+        return self._skip_turns(int(turns)) if turns > 0 else 0
+
+    def _skip_turns(self, turns: int) -> int:
+        for pawn in (*self.party, self.boss):
+            pawn._skip_turns(turns)
+        self.turn_count += turns
+        if self.profile.enabled:
+            self.profile.turns += turns
+        return turns
+
+    def _begin_steps(self) -> None:
+        if self._over:
+            raise ValueError("The fight is over")
+        if not self._started:
+            self._engine_turn(self.profile.clock(), render=False)
+
+    def _end_step(self) -> bool:
+        'the engine half of a stepped turn, or the game-over turn; False once the fight is over'
+        if self.party.is_alive and self.boss.is_alive:
+            self._engine_turn(self.profile.clock(), render=False)
+        if self.party.is_alive and self.boss.is_alive:
+            return True
+        self._game_over(render=False)
+        return False
+
+    def _own(self, value: Any) -> Any:
+        '''
+        An argument from another fork of this level swapped for this level's own:
+        pawns by name, the party, the board and its squares by position, inside
+        tuples and lists too. Pawns that aren't in this level raise ValueError.
+        '''
+        if isinstance(value, Pawn):
+            pawns = (*self.party, self.boss)
+            if any(pawn is value for pawn in pawns):
+                return value
+            for pawn in pawns:
+                if pawn.name == value.name:
+                    return pawn
+            raise ValueError(f"{value.name} isn't in this level")
+        if isinstance(value, Party):
+            return self.party
+        if isinstance(value, Board):
+            return self.board
+        if isinstance(value, Square):
+            square = self.board.at(value.position)
+            if square is None:
+                raise ValueError(f"{value.name} isn't on this level's board")
+            return square
+        if type(value) in (tuple, list):
+            return type(value)(self._own(item) for item in value)
+        return value
+
+    def _pairs(self, per_hero: Any) -> list[tuple[Pawn, Any]]:
+        '(hero, value) pairs from a sequence in `party.members` order, or a dict keyed by hero or hero name'
+        members = self.party.members
+        if not isinstance(per_hero, dict):
+            return list(zip(members, per_hero))
+        pairs = []
+        for key, value in per_hero.items():
+            name = key.name if isinstance(key, Pawn) else key
+            hero = next((member for member in members if member is key or member.name == name), None)
+            if hero is None:
+                raise ValueError(f"No hero named {name!r} in the party")
+            pairs.append((hero, value))
+        return pairs
+
+    def _act(self, actions: Any) -> None:
+        if actions:
+            self._play(self._pairs(actions))
+
+    def _play(self, pairs: list[tuple[Pawn, Any]]) -> None:
+        "play each hero's action, in order"
+        for hero, action in pairs:
+            for call in (action if isinstance(action, list) else [action]):
+                if call is None:
+                    continue
+                if callable(call):
+                    call(hero)
+                    continue
+                if isinstance(call, str):
+                    call = (call,)
+                name, *args = call
+                getattr(hero, name)(*[self._own(arg) for arg in args])
+
     def __str__(self):
         return f"{self._marquis}\n{self.board}"
 
@@ -1,13 +1,13 @@
 import copy
 import abc
 import heapq
-import itertools
 import random
 from typing import List, Tuple, Union
 
 from .entities.board import Board
 from .entities.monster import Monster
-from .entities.pawn import Pawn, _action_decorator
+from .entities.pawn import Pawn, _Cycle, _action_decorator
+from .entities.timeline import Timeline
 from .entities.characters import Party
 
 from .utilities.location import Point, distance_between, bresenham
@@ -17,61 +17,87 @@ from .buffs import HoT
 from .weapons import Claymore, Dagger, Sword, TreeTrunk
 
 class Boss(Monster, abc.ABC):
+    # True for bosses whose `_tick_logic` does nothing on turns when none of their mechanics are due
+    _idle_between_mechanics = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # the boss's mechanics, for the engine and the party's code; see `entities.timeline`
+        self.timeline = Timeline()
+
     @abc.abstractmethod
     def _tick_logic(self, party: Party, board: Board):
         ...
 
-    def _astar(self, board: Board, start: Union[Point,Tuple], goal: Union[Point,Tuple]) -> list[Point] | None:
-
-        start = tuple(start)
-        goal = tuple(goal)
+    def _idle_turns(self, party: Party, board: Board) -> Union[int, float]:
+        '''
+        How many of the coming engine turns `_tick_logic` is sure to do nothing in,
+        as long as the party doesn't move or act; the engine doesn't call it on
+        those turns (see also `Level.fast_forward()`). 0 for a boss that acts
+        every turn; otherwise the turns until its next mechanic.
+        '''
+        if not self._idle_between_mechanics:
+            return 0
+        # `_tick_logic` runs after `_tick` has moved `_turn` on
+        return self.timeline.next_turn(self._turn, self) - self._turn - 1
+
+    def upcoming_mechanics(self, count: int = 5) -> list[tuple[int, str]]:
+        '''
+        The boss's next `count` mechanics as (turn, name) pairs, soonest first. A
+        mechanic listed for turn T goes off right after the party's turn T, so
+        on turn T it's time to get out of the way.
+        '''
+        return self.timeline.upcoming(self._turn, count, self)
 
-        neighbors = [(0, 1), (0, -1), (1, 0), (-1, 0),
-                    (1, 1), (1, -1), (-1, 1), (-1, -1)]
+    def _astar(self, board: Board, start: Union[Point,Tuple], goal: Union[Point,Tuple]) -> list[Point] | None:
+        # works on indexes into the board's padded `_cells`: the wall border means
+        # every neighbour of a square on the board is a valid (impassable) index
+        cells, stride = board._cells, board._stride
+        sx, sy = start[0], start[1]
+        gx, gy = goal[0], goal[1]
+        start_index = (sy + 1) * stride + sx + 1
+        goal_index = (gy + 1) * stride + gx + 1 if 0 <= gx < board.width and 0 <= gy < board.height else -1
+
+        neighbors = [(i, j, j * stride + i, (i * i + j * j) ** 0.5)
+                     for i, j in ((0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1))]
         close_set = set()
         came_from = {}
-        gscore = {start: 0}
-        fscore = {start: distance_between(start, goal)}
+        gscore = {start_index: 0}
+        # how many entries each square has in the heap, instead of scanning it
+        in_heap = {start_index: 1}
 
+        # entries sort by f, then x, then y
         oheap = []
-        heapq.heappush(oheap, (fscore[start], start))
+        heapq.heappush(oheap, (((sx - gx) ** 2 + (sy - gy) ** 2) ** 0.5, sx, sy, start_index))
         while oheap:
-            current = heapq.heappop(oheap)[1]
-            if current == goal:
+            _, x, y, current = heapq.heappop(oheap)
+            in_heap[current] -= 1
+            if current == goal_index:
                 data = []
                 while current in came_from:
-                    data.append(Point(*current))
+                    data.append(Point((current % stride) - 1, (current // stride) - 1))
                     current = came_from[current]
                 return data[::-1]
 
             close_set.add(current)
 
-            for i, j in neighbors:
-                neighbor = current[0] + i, current[1] + j
-                tentative_g_score = gscore[current] + distance_between(current, neighbor)
-
-                if 0 <= neighbor[0] < board.grid_size:
-                    if 0 <= neighbor[1] < board.grid_size:
-                        if (board.at(neighbor).impassable or board.at(neighbor).is_lava) and neighbor != goal: # type: ignore
-                            continue
+            for i, j, offset, step in neighbors:
+                neighbor = current + offset
+                tentative_g_score = gscore[current] + step
 
-                    else:
-                        # grid bound y walls
-                        continue
-
-                else:
-                    # grid bound x walls
+                cell = cells[neighbor]
+                if (cell.impassable or cell.is_lava) and neighbor != goal_index:
                     continue
 
                 if neighbor in close_set and tentative_g_score >= gscore.get(neighbor, 0):
                     continue
 
-                if tentative_g_score < gscore.get(neighbor, 0) or neighbor not in [i[1]for i in oheap]:
+                if tentative_g_score < gscore.get(neighbor, 0) or not in_heap.get(neighbor, 0):
+                    nx, ny = x + i, y + j
                     came_from[neighbor] = current
                     gscore[neighbor] = tentative_g_score # type: ignore
-                    fscore[neighbor] = tentative_g_score + distance_between(neighbor, goal)
-
-                    heapq.heappush(oheap, (fscore[neighbor], neighbor))
+                    in_heap[neighbor] = in_heap.get(neighbor, 0) + 1
+                    heapq.heappush(oheap, (tentative_g_score + ((nx - gx) ** 2 + (ny - gy) ** 2) ** 0.5, nx, ny, neighbor))
 
 
 
@@ -252,6 +278,7 @@ class KoboldGoddess(Boss):
         self.equip(Claymore())
 
         self.last_party_positions : List = [] # #<== Death touch mechanic property
+        self.timeline.every('devour souls', 5)
 
     def get_target(self, party: Party) -> Pawn:
         return self._get_target(party)
@@ -260,7 +287,7 @@ class KoboldGoddess(Boss):
         self.telegraph = None
         target = self._get_target(party)
 
-        if self._turn and self._turn % 5 == 0:
+        if self.timeline.due('devour souls', self._turn, self):
             self.last_party_positions = [p.position for p in party]
             self.telegraph = "is going to devour your souls if you don't move this turn!!!"
         elif self.telegraph:
@@ -320,8 +347,11 @@ class SavageMountainTroll(Boss):
         self._melee_turn_counter = 0
         self._cycle_turn_counter = 0
         self._cycling = False
-        self._action_cycle = itertools.cycle([self.decimate, self.roar_of_giants, self.colossal_smash])
+        self._action_cycle = _Cycle([self.decimate, self.roar_of_giants, self.colossal_smash])
         self._furthest_position : Point = Point(0, 0)
+        self.timeline.every('cycle', 10)
+        self.timeline.when('throw boulder', lambda boss: boss._throwing)
+        self.timeline.when('death charge', lambda boss: boss._melee_turn_counter >= 2)
 
     def get_target(self, party: Party) -> Pawn:
         # get closest party member
@@ -331,17 +361,17 @@ class SavageMountainTroll(Boss):
         self.telegraph = None
         target = self.get_target(party)
 
-        if self._turn and self._turn % 10 == 0:
+        if self.timeline.due('cycle', self._turn, self):
             self._cycling = True
 
-        if self._throwing:
+        if self.timeline.due('throw boulder', self._turn, self):
             self.throw_boulder(self._furthest_position, party)
         
         if self._was_in_melee and distance_between(self.position, target.position) > 1.5:
             self._melee_turn_counter += 1
 
         if not self.acted_this_turn:
-            if self._melee_turn_counter >= 2:
+            if self.timeline.due('death charge', self._turn, self):
                 self.death_charge(party=party, board=board)
 
             elif self._cycling:
@@ -399,6 +429,8 @@ class SavageMountainTroll(Boss):
 
 
 class ChessMaster(Boss):
+    _idle_between_mechanics = True
+
     def __init__(self):
         name="Chess Master"
         position=Point(0, 0)
@@ -406,20 +438,23 @@ class ChessMaster(Boss):
         super().__init__(name=name, position=position, health_max=health_max)
 
         self._turn_counter = 0
-        self._action_cycle = itertools.cycle([self.king, self.queen, self.rook, self.bishop, self.knight, self.curtain])
-        self._action_name_cycle = itertools.cycle(["king", "queen", "rook", "bishop", "knight", "pawn advance"])
+        self._action_cycle = _Cycle([self.king, self.queen, self.rook, self.bishop, self.knight, self.curtain])
+        self._action_name_cycle = _Cycle(["king", "queen", "rook", "bishop", "knight", "pawn advance"])
         self._turn_counter = 0
+        self.timeline.when('strike', lambda boss: boss.telegraph)
+        self.timeline.every('pick a move', 5)
+        self.timeline.when('curtain', lambda boss: boss._turn_counter)
 
     def get_target(self, party: Party) -> Pawn:
         # get random party member
         return random.choice(party.members)
 
     def _tick_logic(self, party: Party, board: Board):
-        if self.telegraph:
+        if self.timeline.due('strike', self._turn, self):
             next(self._action_cycle)(party, board)
             self.telegraph=None
 
-        if self._turn and self._turn % 5 == 0:
+        if self.timeline.due('pick a move', self._turn, self):
             self._target = self.get_target(party)
             self._attack_position = copy.copy(self._target.position)
             action = next(self._action_name_cycle)
@@ -428,22 +463,15 @@ class ChessMaster(Boss):
             else:
                 self.telegraph = f"is going to advance the pawn row!"
 
-        if self._turn_counter:
+        if self.timeline.due('curtain', self._turn, self):
             self.curtain(party, board)  
 
     @_action_decorator(cooldown=1, melee=False, affected_by_blind=False, affected_by_root=False) # type: ignore
     def king(self, party: Party, board: Board):
-        for xmod in (-1, 0, 1):
-            for ymod in (-1, 0, 1):
-                if xmod == 0 and ymod == 0:
-                    continue
-                x = self._attack_position.x + xmod
-                y = self._attack_position.y + ymod
-                if x < 0 or x >= board.width or y < 0 or y >= board.height:
-                    continue
-                for member in party.members:
-                    if member.position == Point(x, y):
-                        member._take_damage(self, self.calculate_damage(160, member), "physical")
+        for square in board.get_adjacent_squares(self._attack_position):
+            for member in party.members:
+                if member.position == square.position:
+                    member._take_damage(self, self.calculate_damage(160, member), "physical")
     
     @_action_decorator(cooldown=1, melee=False, affected_by_blind=False, affected_by_root=False) # type: ignore
     def queen(self, party: Party, board: Board):
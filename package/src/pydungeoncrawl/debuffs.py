@@ -1,6 +1,6 @@
 
 import random
-from .entities.effects import Effect
+from .entities.effects import Effect, register_reaction
 from .utilities.location import bresenham
 
 #############################
@@ -211,3 +211,6 @@ class FireResistance(Effect):
         super().__init__(name="Fire Resistance", duration=20, category={
             'resist', 'fire', 'fire resistance'}, take_bonus_damage_percent=-.10, symbol='🥵')
 
+
+# a target carrying both frost and fire resistance becomes vulnerable to magic
+register_reaction('Frost Resistance', 'Fire Resistance', product=MagicVulnerability)
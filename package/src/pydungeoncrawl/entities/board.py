@@ -1,9 +1,24 @@
-from typing import Tuple, Union
+import re
+from typing import Any, NamedTuple, Protocol, Sequence, Tuple, Union
 from .pawn import Pawn
 from ..utilities.location import Point, bresenham, distance_between
 
 
+class _Journal:
+    '''
+    Records the state of each square the first time it changes after `Board.snapshot()`,
+    so `Board.restore()` only has to touch the squares that actually changed.
+    '''
+    def __init__(self) -> None:
+        self.active = False
+        self.saved: dict[int, tuple['Square', dict]] = {}
+        # sets that collect every square that changes, from `Board._watch()`
+        self.watchers: list[set['Square']] = []
+
+
 class Square:
+    _journal: Union[_Journal, None] = None
+
     def __init__(self, position: Point, symbol: str = '⬜', impassable: bool = False, is_water: bool = False,
                  is_burning: bool = False, is_lava: bool = False, damage: int = 0, occupant: Union[Pawn, None] = None) -> None:
         self.position = position
@@ -17,6 +32,16 @@ class Square:
         self.damage = damage
         self.occupant = occupant
 
+    def _touch(self) -> None:
+        'save the state of the square before it changes, if its board is keeping a snapshot'
+        journal = self._journal
+        if journal is None:
+            return
+        if journal.active and id(self) not in journal.saved:
+            journal.saved[id(self)] = (self, self.__dict__.copy())
+        for watcher in journal.watchers:
+            watcher.add(self)
+
     @property
     def name(self) -> str:
         return f"Tile at {self.position}"
@@ -34,6 +59,7 @@ class Square:
         return self._symbol
 
     def toggle_burning(self, damage: int = 3) -> None:
+        self._touch()
         if self.is_burning:
             self.is_burning = False
             self._symbol = self._base_symbol
@@ -44,6 +70,7 @@ class Square:
             self.damage = damage
 
     def toggle_lava(self) -> None:
+        self._touch()
         if self.is_lava:
             self.is_lava = False
             self._symbol = self._base_symbol
@@ -54,9 +81,11 @@ class Square:
             self.damage = 10000
 
     def set_temp_symbol(self, symbol: str) -> None:
+        self._touch()
         self._symbol = symbol
 
     def clear_temp_symbol(self) -> None:
+        self._touch()
         self._symbol = ''
 
     @property
@@ -73,6 +102,7 @@ class Square:
             return "the square is occupied!"
         if self.impassable:
             return "the square is impassable!"
+        self._touch()
         self.occupant = new_occupant
         return 'success'
 
@@ -83,7 +113,21 @@ class Square:
         return self.symbol if not self.occupied else self.occupant.symbol  # type: ignore
 
 
+# neighbour (x, y) offsets, in the order `get_adjacent_squares` returns them
+_ADJACENT = tuple((x, y) for x in (-1, 0, 1) for y in (-1, 0, 1) if not (x == y == 0))
+
+# the sentinel wall around a board's flat grid; the public API never returns it
+_WALL = Square(Point(-1, -1), '⬛', impassable=True)
+
+
 class Board:
+    '''
+    Besides `grid` (rows of squares, `grid[y][x]`), a board keeps the same squares in
+    a flat list, `_cells`, padded with a one-square `_WALL` border on every side:
+    the square at (x, y) is `_cells[(y + 1) * _stride + x + 1]`. Any neighbour of a
+    square on the board is then a valid index, so hot loops (pathfinding, adjacency)
+    can step by `_adjacent_offsets` without checking bounds; the wall is impassable.
+    '''
     # assume all levels are square
     def __init__(self, grid: list[list[Square]] | None = None, grid_size: int = 20):
         if grid:
@@ -98,29 +142,129 @@ class Board:
                 for x in range(grid_size):
                     self.grid[y].append(Square(Point(x, y)))
 
+        self._journal = _Journal()
+        # entity stores drawn over the squares, from `Board._show()`
+        self._overlays: list[Any] = []
+        self._fork_base: Union[_ForkTemplate, None] = None
+        # the squares that differ from the fork template
+        self._fork_changed: set[Square] = set()
+        self._height = len(self.grid)
+        self._width = len(self.grid[0]) if self.grid else 0
+        self._stride = self._width + 2
+        self._adjacent_offsets = tuple(y * self._stride + x for x, y in _ADJACENT)
+        self._cells: list[Square] = [_WALL] * self._stride
+        for row in self.grid:
+            for square in row:
+                square._journal = self._journal
+            self._cells += [_WALL, *row, _WALL]
+        self._cells += [_WALL] * self._stride
+
+    ######################
+    # ~~ Snapshotting ~~ #
+    ######################
+
+    def snapshot(self) -> None:
+        '''
+        Remember the current state of the board. Every square changed after this
+        call through `Square`/`Board` methods (terrain toggles, occupants, symbols)
+        can be put back with `restore()`.
+        '''
+        self._journal.saved = {}
+        self._journal.active = True
+
+    def restore(self) -> int:
+        '''
+        Put every square changed since `snapshot()` back the way it was, and keep
+        tracking changes from that same snapshot. Only the changed squares are
+        touched. Pawns are not moved; returns the number of squares restored.
+        '''
+        if not self._journal.active:
+            raise RuntimeError("Board.snapshot() must be called before Board.restore()")
+        saved = self._journal.saved
+        watchers = self._journal.watchers
+        for square, state in saved.values():
+            square.__dict__.clear()
+            square.__dict__.update(state)
+            for watcher in watchers:
+                watcher.add(square)
+        self._journal.saved = {}
+        return len(saved)
+
+    def _changes(self) -> dict[int, tuple[Square, dict]]:
+        'the current state of every square changed since the snapshot, for `Level.snapshot()`'
+        journal = self._journal
+        if not journal.active:
+            self.snapshot()
+        return {key: (square, square.__dict__.copy()) for key, (square, _) in journal.saved.items()}
+
+    def _revert_to(self, changes: dict[int, tuple[Square, dict]]) -> None:
+        'put every changed square back to its state in `changes`, or its original state if it changed later'
+        watchers = self._journal.watchers
+        for key, (square, original) in self._journal.saved.items():
+            state = changes[key][1] if key in changes else original
+            square.__dict__.clear()
+            square.__dict__.update(state)
+            for watcher in watchers:
+                watcher.add(square)
+
+    def _watch(self) -> set[Square]:
+        'a set that every square changed from now on is added to; the caller empties it as it pleases'
+        watcher: set[Square] = set()
+        self._journal.watchers.append(watcher)
+        return watcher
+
+    def _unwatch(self, watcher: set[Square]) -> None:
+        self._journal.watchers = [w for w in self._journal.watchers if w is not watcher]
+
+    def _show(self, overlay: Any) -> None:
+        'draw the (x, y, symbol)s of `overlay._symbols()` over the empty squares from now on'
+        self._overlays.append(overlay)
+
+    def _hide(self, overlay: Any) -> None:
+        self._overlays = [o for o in self._overlays if o is not overlay]
+
+    def _is_occupied(self, x: int, y: int) -> bool:
+        return self.grid[y][x].occupied
+
+    def _overlay(self, rows: list[list[str]]) -> list[list[str]]:
+        top = self._height - 1
+        for overlay in self._overlays:
+            for x, y, symbol in overlay._symbols():
+                if not self._is_occupied(x, y):
+                    rows[top - y][x] = symbol
+        return rows
+
+    @property
+    def changed_squares(self) -> list[Square]:
+        "get a list of the squares changed since the last snapshot (or restore)"
+        return [square for square, _ in self._journal.saved.values()]
+
     def _tick(self):
         for row in self.grid:
             for square in row:
                 if square.occupied and square.position != square.occupant.position: # type: ignore
+                    square._touch()
                     square.occupant = None
                 square.trigger_effect()
+
     @property
     def width(self) -> int:
-        return len(self.grid[0])
+        return self._width
 
     @property
     def height(self) -> int:
-        return len(self.grid)
-        
-    def at(self, position: Union[Point, Tuple[int, int]]) -> Square | None:
-        "get square at position (x, y)"
+        return self._height
 
-        if isinstance(position, tuple):
-            position = Point(position[0], position[1])
+    def _index(self, x: int, y: int) -> int:
+        "index of (x, y) in the padded `_cells`; only meaningful for points on the board"
+        return (y + 1) * self._stride + x + 1
 
-        if (0 > position.x >= len(self.grid[0])) or (0 > position.y >= len(self.grid)):
+    def at(self, position: Union[Point, Tuple[int, int]]) -> Square | None:
+        "get square at position (x, y)"
+        x, y = position[0], position[1]
+        if not (0 <= x < self._width and 0 <= y < self._height):
             return None
-        return self.grid[position.y][position.x]
+        return self._cells[(y + 1) * self._stride + x + 1]
 
     def place(self, pawn: Pawn, position: Point) -> str:
         '''Place a pawn in the square; returns True if successful.'''
@@ -175,23 +319,23 @@ class Board:
 
     def get_squares_in_radius(self, origin: Union[Point, tuple[int,int]], radius: int) -> list[Square]:
         "get a list of squares in the provided radius"
-        if isinstance(origin, tuple):
-            origin = Point(*origin)
-        return list(filter(None,
-                           [self.at(Point(origin.x + x, origin.y + y))
-                           for x in range(-radius, radius + 1)
-                           for y in range(-radius, radius + 1)
-                           if (x ** 2 + y ** 2) <= radius ** 2]))
+        ox, oy = origin[0], origin[1]
+        cells, stride = self._cells, self._stride
+        # clip the offsets to the board rather than checking every square
+        ys = range(max(-radius, -oy), min(radius, self.height - 1 - oy) + 1)
+        return [cells[(oy + y + 1) * stride + ox + x + 1]
+                for x in range(max(-radius, -ox), min(radius, self.width - 1 - ox) + 1)
+                for y in ys
+                if (x ** 2 + y ** 2) <= radius ** 2]
 
     def get_adjacent_squares(self, position: Union[Point,tuple[int,int]]) -> list[Square]:
         "get a list of adjacent squares"
-        if isinstance(position, tuple):
-            position = Point(*position)
-        return list(filter(None,
-                           [self.at(Point(position.x + x, position.y + y))
-                           for x in [-1, 0, 1]
-                           for y in [-1, 0, 1]
-                           if not (x == y == 0)]))
+        x, y = position[0], position[1]
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return list(filter(None, [self.at((x + i, y + j)) for i, j in _ADJACENT]))
+        cells = self._cells
+        index = self._index(x, y)
+        return [cell for cell in [cells[index + offset] for offset in self._adjacent_offsets] if cell is not _WALL]
 
     def get_adjacent_entities(self, origin: Pawn) -> list[Pawn]:
         "get a list of all entities in melee range of the origin pawn"
@@ -205,12 +349,12 @@ class Board:
         "get the nearest player to the origin pawn"
         player = None
         radius = 1
-        while player is None:
-            players = self.get_players_in_range(origin.position, radius)
+        while player is None and radius <= self.width + self.height:
+            players = [p for p in self.get_players_in_range(origin.position, radius) if p is not origin]
             if players:
-                player = min(players, key=lambda p: distance_between(origin, p)) # type: ignore
+                player = min(players, key=lambda p: distance_between(origin.position, p.position))
             radius += 1
-        return player
+        return player # type: ignore
 
     def distance_between(self, origin: Union[Pawn, Point], destination: Union[Pawn, Point]) -> float:
         "get the distance between two points"
@@ -227,15 +371,353 @@ class Board:
     def __repr__(self):
         return f"Board({len(self.grid)} * {len(self.grid[0])} grid)"
 
-    def __str__(self):
-        s = ""
-        for y in range(len(self.grid)-1, -1, -1):
-            for x in range(len(self.grid[0])):
-                s += str(self.grid[y][x].symbol)
-            s += "\n"
+    def _symbol_rows(self) -> list[list[str]]:
+        "the symbol of every square, one list per row, top (highest y) row first"
+        rows = [[str(square.symbol) for square in row] for row in reversed(self.grid)]
+        return self._overlay(rows) if self._overlays else rows
 
-        return s
+    def __str__(self):
+        return "".join("".join(row) + "\n" for row in self._symbol_rows())
 
     def __getitem__(self, position: Union[Point,tuple[int,int]]) -> Square | None:
         return self.at(position)
 
+    def _live_squares(self):
+        "every square that can have changed since the board was made"
+        return (square for row in self.grid for square in row)
+
+    def _terrain_symbols(self) -> list[str]:
+        "the symbol of every square ignoring occupants, row by row starting at y = 0"
+        return [square._temp_symbol or square._symbol for row in self.grid for square in row]
+
+    def find_symbol(self, symbol: str) -> list[Square]:
+        "get a list of the squares showing `symbol`, ordered by y and then x"
+        return [square for row in self.grid for square in row if square.symbol == symbol]
+
+    #################
+    # ~~ Forking ~~ #
+    #################
+
+    def _fork_template(self) -> '_ForkTemplate':
+        '''
+        The board as it was the first time it was forked, as a template of square
+        kinds; from then on the journal collects the squares that differ from it.
+        '''
+        template = self._fork_base
+        if template is None:
+            kinds: dict[tuple, int] = {}
+            palette: list[_SquareTile] = []
+            tiles = bytearray()
+            for row in self.grid:
+                for square in row:
+                    state = {key: value for key, value in square.__dict__.items()
+                             if key not in ('position', 'occupant', '_journal')}
+                    key = tuple(state.items())
+                    tile = kinds.get(key)
+                    if tile is None:
+                        if len(palette) == 256:
+                            raise ValueError("Can't fork a board with more than 256 kinds of square")
+                        tile = kinds[key] = len(palette)
+                        palette.append(_SquareTile(state))
+                    tiles.append(tile)
+            template = self._fork_base = _ForkTemplate(self._width, self._height, tuple(palette), bytes(tiles))
+            # the template has no occupants, so occupied squares already differ from it
+            self._fork_changed = self._watch()
+            self._fork_changed.update(square for row in self.grid for square in row if square.occupied)
+        return template
+
+    def _fork(self, memo: dict[int, Any]) -> 'LazyBoard':
+        '''
+        A copy-on-write copy of the board for `Level.fork()`: a LazyBoard over the
+        fork template that starts with copies of the squares that differ from it.
+        '''
+        template = self._fork_template()
+        width = self._width
+        return LazyBoard._forked(template, {square.position.y * width + square.position.x: square
+                                            for square in self._fork_changed},
+                                 memo)
+
+
+class _Tile(Protocol):
+    symbol: str
+    impassable: bool
+    is_burning: bool
+    is_lava: bool
+    is_water: bool
+    damage: int
+
+    def to_square(self, position: Point) -> Square: ...
+
+
+class _Template(Protocol):
+    'the parts of `map_format.MapTemplate` a LazyBoard needs'
+    width: int
+    height: int
+    palette: Sequence[_Tile]
+    tiles: Sequence[int]
+
+
+class _SquareTile:
+    'a kind of square in a fork template: every attribute of a square except its position and occupant'
+    def __init__(self, state: dict[str, Any]) -> None:
+        self.state = state
+        self.symbol = state['_temp_symbol'] or state['_symbol']
+        self.impassable = state['_impassable']
+        self.is_burning = state['is_burning']
+        self.is_lava = state['is_lava']
+        self.is_water = state['is_water']
+        self.damage = state['damage']
+
+    def to_square(self, position: Point) -> Square:
+        square = Square.__new__(Square)
+        square.__dict__.update(self.state)
+        square.position = position
+        square.occupant = None
+        return square
+
+
+class _ForkTemplate(NamedTuple):
+    'what forks of an eager Board share; satisfies `_Template`'
+    width: int
+    height: int
+    palette: tuple[_SquareTile, ...]
+    tiles: bytes
+
+
+class _LazyRow:
+    def __init__(self, board: 'LazyBoard', y: int) -> None:
+        self._board = board
+        self._y = y
+
+    def __len__(self) -> int:
+        return self._board.width
+
+    def __getitem__(self, x: int) -> Square:
+        width = self._board.width
+        if x < 0:
+            x += width
+        if not 0 <= x < width:
+            raise IndexError("row index out of range")
+        return self._board._square(x, self._y)
+
+    def __iter__(self):
+        for x in range(self._board.width):
+            yield self._board._square(x, self._y)
+
+
+class _LazyCells:
+    'the padded flat view of a LazyBoard, like `Board._cells`'
+    def __init__(self, board: 'LazyBoard') -> None:
+        self._board = board
+
+    def __len__(self) -> int:
+        return (self._board.width + 2) * (self._board.height + 2)
+
+    def __getitem__(self, index: int) -> Square:
+        board = self._board
+        y, x = divmod(index, board._stride)
+        if 0 < x <= board.width and 0 < y <= board.height:
+            return board._square(x - 1, y - 1)
+        return _WALL
+
+
+class _LazyGrid:
+    def __init__(self, board: 'LazyBoard') -> None:
+        self._board = board
+
+    def __len__(self) -> int:
+        return self._board.height
+
+    def __getitem__(self, y: int) -> _LazyRow:
+        height = self._board.height
+        if y < 0:
+            y += height
+        if not 0 <= y < height:
+            raise IndexError("grid index out of range")
+        return _LazyRow(self._board, y)
+
+    def __iter__(self):
+        for y in range(self._board.height):
+            yield _LazyRow(self._board, y)
+
+
+class LazyBoard(Board):
+    '''
+    A Board read straight from a map template, usually a memory-mapped compiled
+    map (`MapTemplate.open(path).to_lazy_board()`).
+
+    The template's tiles are never copied. A `Square` is only created the first
+    time its cell is looked at (`at()`, `board[x, y]`, `grid[y][x]`) and is then
+    kept, so every change to the board lives on those squares: they are the
+    hazard overlay over the template's terrain. Squares that have held a pawn
+    are tracked separately (the occupancy overlay), so `_tick` only visits
+    those instead of the whole map.
+
+    `grid` still works, but iterating all of it creates every square; prefer
+    `at()`, `find_symbol()` and the `*_points` properties on big maps.
+    '''
+
+    def __init__(self, template: _Template) -> None:
+        self._template = template
+        self._width = template.width
+        self._height = template.height
+        self.grid_size = template.height
+        self._stride = self._width + 2
+        self._adjacent_offsets = tuple(y * self._stride + x for x, y in _ADJACENT)
+        self._cells = _LazyCells(self)  # type: ignore[assignment]
+        self._squares: dict[int, Square] = {}
+        self._occupied: dict[int, Square] = {}
+        self._journal = _Journal()
+        self._overlays = []
+
+    def _square(self, x: int, y: int) -> Square:
+        index = y * self._width + x
+        square = self._squares.get(index)
+        if square is None:
+            template = self._template
+            square = template.palette[template.tiles[index]].to_square(Point(x, y))
+            square._journal = self._journal
+            self._squares[index] = square
+        return square
+
+    @property
+    def grid(self) -> _LazyGrid:  # type: ignore[override]
+        return _LazyGrid(self)
+
+    @property
+    def materialized(self) -> int:
+        "the number of squares created so far"
+        return len(self._squares)
+
+    def at(self, position: Union[Point, Tuple[int, int]]) -> Square | None:
+        "get square at position (x, y)"
+        x, y = position[0], position[1]
+        if not (0 <= x < self._width and 0 <= y < self._height):
+            return None
+        return self._square(x, y)
+
+    def place(self, pawn: Pawn, position: Point) -> str:
+        '''Place a pawn in the square; returns True if successful.'''
+        square = self.at(position)
+        if square is None:
+            return "the square is out of bounds!"
+        result = square.place(pawn)
+        if result == 'success':
+            self._occupied[square.position.y * self._width + square.position.x] = square
+        return result
+
+    def restore(self) -> int:
+        # a restored square may get its occupant back
+        for square, state in self._journal.saved.values():
+            if state.get('occupant') is not None:
+                self._occupied[square.position.y * self._width + square.position.x] = square
+        return super().restore()
+
+    @classmethod
+    def _forked(cls, template: _Template, squares: dict[int, Square], memo: dict[int, Any]) -> 'LazyBoard':
+        'a new board over `template`, starting with copies of `squares` whose occupants are swapped through `memo`'
+        board = cls(template)
+        journal = board._journal
+        for index, square in squares.items():
+            clone = Square.__new__(Square)
+            clone.__dict__.update(square.__dict__)
+            clone._journal = journal
+            if clone.occupant is not None:
+                clone.occupant = memo.get(id(clone.occupant), clone.occupant)
+                board._occupied[index] = clone
+            board._squares[index] = clone
+        return board
+
+    def _fork(self, memo: dict[int, Any]) -> 'LazyBoard':
+        'forks share the template and copy only the squares created so far'
+        return LazyBoard._forked(self._template, self._squares, memo)
+
+    def _revert_to(self, changes: dict[int, tuple[Square, dict]]) -> None:
+        super()._revert_to(changes)
+        for square, _ in self._journal.saved.values():
+            if square.occupant is not None:
+                self._occupied[square.position.y * self._width + square.position.x] = square
+
+    def _tick(self):
+        for index, square in list(self._occupied.items()):
+            if square.occupied and square.position != square.occupant.position: # type: ignore
+                square._touch()
+                square.occupant = None
+            square.trigger_effect()
+            if not square.occupied:
+                del self._occupied[index]
+
+    ##################
+    # ~~ Overlays ~~ #
+    ##################
+
+    def _points(self, tile_matches, square_matches) -> list[Point]:
+        'points whose square (if created) or template tile (if not) matches, ordered by y and then x'
+        template = self._template
+        width = self._width
+        squares = self._squares
+        tile_ids = bytes(i for i, tile in enumerate(template.palette) if tile_matches(tile))
+        indexes = []
+        if tile_ids:
+            # scan the (possibly memory-mapped) tiles in C without copying them
+            pattern = re.compile(b'[' + b''.join(re.escape(bytes((i,))) for i in tile_ids) + b']')
+            indexes = [match.start() for match in pattern.finditer(template.tiles)  # type: ignore[arg-type]
+                       if match.start() not in squares]
+        indexes += [index for index, square in squares.items() if square_matches(square)]
+        return [Point(index % width, index // width) for index in sorted(indexes)]
+
+    @property
+    def dangerous_points(self) -> list[Point]:
+        "get a list of points that are dangerous"
+        return self._points(lambda tile: tile.is_burning or tile.is_lava,
+                            lambda square: square.is_burning or square.is_lava)
+
+    @property
+    def dangerous_positions(self) -> list[Tuple[int, int]]:
+        "get a list of positions that are dangerous"
+        return [point.to_tuple() for point in self.dangerous_points]
+
+    @property
+    def impassable_points(self) -> list[Point]:
+        "get a list of points that are impassable"
+        return self._points(lambda tile: tile.impassable, lambda square: square.impassable)
+
+    @property
+    def impassable_positions(self) -> list[Tuple[int, int]]:
+        "get a list of positions that are impassable"
+        return [point.to_tuple() for point in self.impassable_points]
+
+    def find_symbol(self, symbol: str) -> list[Square]:
+        "get a list of the squares showing `symbol`, ordered by y and then x"
+        return [self._square(point.x, point.y)
+                for point in self._points(lambda tile: tile.symbol == symbol,
+                                          lambda square: square.symbol == symbol)]
+
+    def __repr__(self):
+        return f"LazyBoard({self._height} * {self._width} grid, {len(self._squares)} squares created)"
+
+    def _live_squares(self):
+        return iter(list(self._squares.values()))
+
+    def _is_occupied(self, x: int, y: int) -> bool:
+        square = self._squares.get(y * self._width + x)
+        return square is not None and square.occupied
+
+    def _terrain_symbols(self) -> list[str]:
+        symbols = [tile.symbol for tile in self._template.palette]
+        terrain = [symbols[tile_id] for tile_id in self._template.tiles]
+        for index, square in self._squares.items():
+            terrain[index] = square._temp_symbol or square._symbol
+        return terrain
+
+    def _symbol_rows(self) -> list[list[str]]:
+        template = self._template
+        palette, tiles, squares = template.palette, template.tiles, self._squares
+        width = self._width
+        rows = []
+        for y in range(self._height - 1, -1, -1):
+            offset = y * width
+            rows.append([str(squares[offset + x].symbol) if offset + x in squares
+                         else palette[tiles[offset + x]].symbol
+                         for x in range(width)])
+        return self._overlay(rows) if self._overlays else rows
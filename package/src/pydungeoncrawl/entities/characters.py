@@ -53,6 +53,17 @@ class Party:
         self.name = "The party"
         self.position = Point(0, 0)
 
+    def _fork(self, memo: dict) -> 'Party':
+        'the copy of the party for `Level.fork()`, made of the copies of its members in `memo`'
+        clone = Party.__new__(Party)
+        memo[id(self)] = clone
+        clone.__dict__.update(self.__dict__)
+        clone.members = tuple(member._fork(memo) for member in self.members)
+        clone._tank = memo[id(self._tank)]
+        clone._healer = memo[id(self._healer)]
+        clone._dps = tuple(memo[id(member)] for member in self._dps)
+        return clone
+
     def _tick(self):
         for member in self.members:
             member._tick()
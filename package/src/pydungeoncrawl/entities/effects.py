@@ -1,7 +1,9 @@
 import time
 import hashlib
+import itertools
 from collections import Counter
-from typing import Iterator, Union
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator, Union
 
 _SORT_PRIORITY = {
     "Might": 1,
@@ -17,6 +19,33 @@ _SORT_PRIORITY = {
     "Reflect": 11
 }
 
+# lifecycle hooks that an Effect subclass can override
+_HOOKS = ('on_create', 'on_expire', 'on_tick', 'on_activate')
+
+# hooks that are dispatched by the bearer every turn
+_TICK_HOOKS = frozenset(('on_create', 'on_tick'))
+
+# `Effects._version` stamps; never reused, so a restored snapshot still reads as a change
+_VERSIONS = itertools.count(1)
+
+# `Effects._status()` bits
+STUNNED, BLINDED, ROOTED = 1, 2, 4
+
+
+def _fork_value(value: Any, memo: dict[int, Any]) -> Any:
+    '''
+    An attribute value for a copy made by `Level.fork()`: objects already copied
+    (pawns, the party, effects) are swapped for their copies, containers are
+    copied, objects with a `_fork(memo)` method copy themselves, and anything
+    else is shared.
+    '''
+    if id(value) in memo:
+        return memo[id(value)]
+    if isinstance(value, (list, dict, set)):
+        return value.copy()
+    fork = getattr(type(value), '_fork', None)
+    return fork(value, memo) if fork is not None else value
+
 
 class Effect:
     """
@@ -44,8 +73,19 @@ class Effect:
     `bonus_max_health` [int] is the amount of hit points added to the Pawn's maximum hit points when this
     effect is applied. A positive number will increase the Pawn's maximum hit points; a negative number
     will decrease the Pawn's hit points. The default value is zero.
+
+    Subclasses only pay for the lifecycle hooks (`on_create`, `on_tick`, `on_expire`, `on_activate`)
+    that they actually override; the names of the overridden hooks are recorded in `_hooks` when the
+    subclass is created, and hooks that aren't in it are never called by the engine.
     """
 
+    _hooks: frozenset[str] = frozenset()
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._hooks = frozenset(hook for hook in _HOOKS
+                               if getattr(cls, hook) is not getattr(Effect, hook))
+
     def __init__(self,
                  name: str,
                  category: set[str] | None = None,
@@ -97,6 +137,12 @@ class Effect:
     def on_activate(self, *args, **kwargs):
         ...
 
+    def _fork(self, memo: dict[int, Any]) -> 'Effect':
+        clone = self.__class__.__new__(self.__class__)
+        memo[id(self)] = clone
+        clone.__dict__.update({key: _fork_value(value, memo) for key, value in self.__dict__.items()})
+        return clone
+
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}({self.duration} turn{'s' if self.duration != 1 else ''})"
 
@@ -114,6 +160,33 @@ class Effect:
         )).encode()).digest(), byteorder='big')
 
 
+@dataclass(frozen=True)
+class Reaction:
+    """
+    A rule that consumes one stack of each of the `reagents` (lowercase effect names) when they are
+    all present on the same bearer, and applies the effect built by `product` in their place.
+    """
+    reagents: tuple[str, ...]
+    product: Callable[[], Effect]
+
+
+# reaction rules indexed by the name of every effect that takes part in them
+_REACTIONS: dict[str, list[Reaction]] = {}
+
+
+def register_reaction(*reagents: str, product: Callable[[], Effect]) -> Reaction:
+    '''
+    Register a reaction between effects, e.g.
+    `register_reaction('Frost Resistance', 'Fire Resistance', product=MagicVulnerability)`
+
+    The rule is checked whenever one of the reagents is added to an `Effects` collection.
+    '''
+    reaction = Reaction(tuple(name.lower() for name in reagents), product)
+    for name in set(reaction.reagents):
+        _REACTIONS.setdefault(name, []).append(reaction)
+    return reaction
+
+
 class Effects:
     '''
     Convenience class for a collection of effects.
@@ -128,7 +201,41 @@ class Effects:
 
     def __init__(self, *effects: Effect):
         self._effects: list[Effect] = list(effects) if effects else []
+        self._tick_hooked: list[Effect] = [e for e in self._effects if e._hooks & _TICK_HOOKS]
         self._reflected = False
+        # changes whenever an effect is added or removed; see `utilities.observation`
+        self._version = next(_VERSIONS)
+        self._status_version = 0
+        self._status_bits = 0
+
+    def _replace(self, effects: list[Effect]) -> None:
+        'replace the contents of the collection and rebuild the hook dispatch list'
+        # every caller passes a filtered subset, so the same length means nothing was removed
+        if len(effects) != len(self._effects):
+            self._version = next(_VERSIONS)
+        self._effects = effects
+        self._tick_hooked = [e for e in effects if e._hooks & _TICK_HOOKS]
+
+    def _snapshot(self) -> tuple[dict[str, Any], list[tuple[Effect, dict[str, Any]]]]:
+        'the state of the collection and of each effect in it, for `Pawn._snapshot()`'
+        return ({key: value.copy() if isinstance(value, list) else value for key, value in self.__dict__.items()},
+                [(effect, effect.__dict__.copy()) for effect in self._effects])
+
+    def _restore(self, state: tuple[dict[str, Any], list[tuple[Effect, dict[str, Any]]]]) -> None:
+        attributes, effects = state
+        self.__dict__.clear()
+        self.__dict__.update({key: value.copy() if isinstance(value, list) else value for key, value in attributes.items()})
+        for effect, effect_state in effects:
+            effect.__dict__.clear()
+            effect.__dict__.update(effect_state)
+
+    def _fork(self, memo: dict[int, Any]) -> 'Effects':
+        clone = Effects.__new__(Effects)
+        clone.__dict__.update(self.__dict__)
+        # effects shared between collections stay shared in the copy
+        clone._effects = [memo[id(effect)] if id(effect) in memo else effect._fork(memo) for effect in self._effects]
+        clone._tick_hooked = [memo[id(effect)] for effect in self._tick_hooked]
+        return clone
 
     #################################
     # ~~ Tick and trigger methds ~~ #
@@ -140,9 +247,15 @@ class Effects:
         self.reflected = False
         for effect in self._effects:
             effect.duration -= 1
-            if effect.duration <= 0:
+            if effect.duration <= 0 and 'on_expire' in effect._hooks:
                 effect.on_expire()
-        self._effects = list(filter(lambda e: e.duration > 0, self._effects))
+        self._replace(list(filter(lambda e: e.duration > 0, self._effects)))
+
+    def _skip(self, turns: int) -> None:
+        'what `turns` calls of `_tick` do when none of the effects expire'
+        self.reflected = False
+        for effect in self._effects:
+            effect.duration -= turns
 
     def _trigger_reflect(self, damager, target, damage: int) -> None:
         'trigger the effects in the collection that reflect damage'
@@ -163,6 +276,30 @@ class Effects:
     def add(self, effect: Effect) -> None:
         'add a single effect to the collection'
         self._effects.append(effect)
+        self._version = next(_VERSIONS)
+        if effect._hooks & _TICK_HOOKS:
+            self._tick_hooked.append(effect)
+        if (reactions := _REACTIONS.get(effect.name.lower())):
+            self._react(effect, reactions)
+
+    def _react(self, effect: Effect, reactions: list[Reaction]) -> None:
+        'apply the first reaction that the newly added effect completes'
+        for reaction in reactions:
+            consumed: list[Effect] = []
+            for name in reaction.reagents:
+                if effect.name.lower() == name and all(e is not effect for e in consumed):
+                    match = effect
+                else:
+                    match = next((e for e in self._effects
+                                  if e.name.lower() == name and all(e is not c for c in consumed)), None)
+                if match is None:
+                    break
+                consumed.append(match)
+            else:
+                consumed_ids = {id(e) for e in consumed}
+                self._replace([e for e in self._effects if id(e) not in consumed_ids])
+                self.add(reaction.product())
+                return
 
     def add_stacks(self, effect_constructor, stacks=1, **kwargs) -> None:
         'add a number of stacks of an effect to the collection'
@@ -171,18 +308,18 @@ class Effects:
 
     def remove(self, effect: Effect) -> None:
         'remove an effect from the collection'
-        self._effects = list(
-            filter(lambda e: e != effect, self._effects))
+        self._replace(list(
+            filter(lambda e: e != effect, self._effects)))
 
     def remove_category(self, category: str) -> None:
         'remove all effects in the collection with the given category'
-        self._effects = list(
-            filter(lambda e: category not in e.category, self._effects))
+        self._replace(list(
+            filter(lambda e: category not in e.category, self._effects)))
 
     def remove_name(self, name: str) -> None:
         'remove all effects in the collection with the given name'
-        self._effects = list(
-            filter(lambda e: e.name.lower() != name.lower(), self._effects))
+        self._replace(list(
+            filter(lambda e: e.name.lower() != name.lower(), self._effects)))
 
     def remove_all(self, *effects: Effect) -> None:
         'remove one effect from the collection'
@@ -192,7 +329,10 @@ class Effects:
     # TODO: __TEST THIS__
     def remove_one(self, effect: Effect) -> None:
         'remove one effect from the collection'
-        self._effects.pop(self._effects.index(effect))
+        removed = self._effects.pop(self._effects.index(effect))
+        self._version = next(_VERSIONS)
+        if removed._hooks & _TICK_HOOKS:
+            self._tick_hooked = [e for e in self._tick_hooked if e is not removed]
 
     def count(self, effect: Union[str, Effect]) -> int:
         'return the number of effects in the collection'
@@ -207,17 +347,26 @@ class Effects:
     @property
     def stunned(self) -> bool:
         'return True if the collection contains a Stun effect'
-        return self.count('Stun') > 0
+        return bool(self._status() & STUNNED)
 
     @property
     def blinded(self) -> bool:
         'return True if the collection contains a Blind effect'
-        return self.count('Blind') > 0
+        return bool(self._status() & BLINDED)
 
     @property
     def rooted(self) -> bool:
         'return True if the collection contains a Root effect'
-        return self.count('Root') > 0
+        return bool(self._status() & ROOTED)
+
+    def _status(self) -> int:
+        'the STUNNED, BLINDED and ROOTED bits, worked out again only after effects are added or removed'
+        if self._status_version != self._version:
+            names = {e.name.lower() for e in self._effects}
+            self._status_bits = (STUNNED * ('stun' in names) | BLINDED * ('blind' in names)
+                                 | ROOTED * ('root' in names))
+            self._status_version = self._version
+        return self._status_bits
 
     @property
     def poisoned(self) -> bool:
@@ -2,16 +2,18 @@ import math
 from collections import Counter
 from dataclasses import dataclass, field
 from functools import singledispatchmethod, wraps
-from typing import Any, Literal, Tuple, Union
+from types import MethodType
+from time import perf_counter_ns
+from typing import Any, Literal, NamedTuple, Sequence, Tuple, Union
 
 from ..armor import ClothArmor
-from ..debuffs import MagicVulnerability
 
 from .equipment import Gear, GearSet
 from .equipment import Equipment
-from .effects import Effect, Effects
+from .effects import BLINDED, ROOTED, STUNNED, Effect, Effects, _fork_value
 
 from ..utilities.location import Point, bresenham, clean_name, distance_between, behinds
+from ..utilities.profiling import Profile
 
 
 @dataclass
@@ -23,6 +25,65 @@ class _Character:
 # ~~~ Ability Decorators ~~~ #
 ##############################
 
+class _Cycle:
+    'like `itertools.cycle`, but its position is a plain index, so `Level.snapshot()` can save it'
+    def __init__(self, items) -> None:
+        self.items = tuple(items)
+        self.index = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item = self.items[self.index]
+        self.index = (self.index + 1) % len(self.items)
+        return item
+
+    def copy(self) -> '_Cycle':
+        cycle = _Cycle.__new__(_Cycle)
+        cycle.items, cycle.index = self.items, self.index
+        return cycle
+
+    def _fork(self, memo: dict[int, Any]) -> '_Cycle':
+        'a copy whose methods are bound to the copies of their pawns'
+        cycle = self.copy()
+        cycle.items = tuple(MethodType(item.__func__, memo[id(item.__self__)])
+                            if isinstance(item, MethodType) and id(item.__self__) in memo else item
+                            for item in self.items)
+        return cycle
+
+
+# pawn attributes that `_snapshot` leaves alone: gear and bookkeeping, and the effects (saved separately)
+_SNAPSHOT_SKIP = frozenset(('effects', 'equipment', '_profile', '_inputs'))
+
+
+def _copy_state(value):
+    'copy the containers a pawn mutates in place; everything else is replaced, not mutated'
+    if isinstance(value, (list, dict, set, _Cycle)):
+        return value.copy()
+    return value
+
+
+def _record_input(func):
+    '''
+    Log calls that player code makes while a level is recording its inputs (see
+    `utilities.replay`). Calls made from inside another logged call aren't logged.
+    '''
+    @wraps(func)
+    def wrapper(self: 'Pawn', *args, **kwargs):
+        log = self._inputs
+        if log is None or not log.active or log.depth:
+            return func(self, *args, **kwargs)
+        log.record(self, func.__name__, args, kwargs)
+        log.depth += 1
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            log.depth -= 1
+
+    return wrapper
+
+
 def _check_can_move(func):
     @wraps(func)
     def wrapper(self: 'Pawn', *args, **kwargs):
@@ -47,7 +108,21 @@ def _check_can_move(func):
             )
         )
 
-    return wrapper
+    return _record_input(wrapper)
+
+
+class Ability(NamedTuple):
+    'an ability as it was declared with `_action_decorator`; see `Pawn.abilities()`'
+    method: str
+    name: str
+    cooldown: int
+    melee: bool
+    affected_by_blind: bool
+    affected_by_root: bool
+
+
+# `Pawn.abilities()` for each class that has been asked
+_ABILITIES: dict[type, tuple[Ability, ...]] = {}
 
 
 def _action_decorator(_func=None, *, cooldown: int = 1, melee: bool = False, affected_by_blind: bool = True, affected_by_root: bool = False):
@@ -100,9 +175,18 @@ def _action_decorator(_func=None, *, cooldown: int = 1, melee: bool = False, aff
             self.action_history.append(self.current_action)
             if target != self:
                 self.face(target if not hasattr(target, 'position') else target.position)
-            return func(self, *args, **kwargs)
 
-        return wrapper
+            profile = self._profile
+            if profile is None or not profile.enabled:
+                return func(self, *args, **kwargs)
+            start = perf_counter_ns()
+            result = func(self, *args, **kwargs)
+            profile.record_ability(self.__class__.__name__, func.__name__, perf_counter_ns() - start)
+            return result
+
+        wrapper._ability = Ability(func.__name__, clean_name(func.__name__), cooldown, melee,  # type: ignore[attr-defined]
+                                   affected_by_blind, affected_by_root)
+        return _record_input(wrapper)
 
     if _func is None:
         return actual_decorator
@@ -147,6 +231,79 @@ class Pawn(_Character):
         self.acted_this_turn = False
         self.moved_this_turn = False
         self.reports: dict[str, Any] = {}
+        self._profile: Union[Profile, None] = None
+        self._inputs = None
+
+    @classmethod
+    def abilities(cls) -> tuple[Ability, ...]:
+        "the abilities of this class (its methods made with `_action_decorator`), sorted by method name"
+        abilities = _ABILITIES.get(cls)
+        if abilities is None:
+            found = (getattr(getattr(cls, name, None), '_ability', None) for name in dir(cls))
+            abilities = _ABILITIES[cls] = tuple(ability for ability in found if isinstance(ability, Ability))
+        return abilities
+
+    def legal_actions(self, targets: Sequence[Union['Pawn', Point]] = ()) -> int:
+        '''
+        Which of `abilities()` could be used on which of `targets` right now, as a
+        bitmask: bit `a * len(targets) + t` is set when ability `a` can be used on
+        `targets[t]`. With no targets, each ability gets one bit, for using it on
+        the pawn itself.
+
+        These are the checks an ability call makes before it does anything (dead,
+        stunned, already acted, cooldown, root, blind, melee range), without the
+        call or the failed `Action` it would log.
+        '''
+        targets = targets or (self,)
+        if self._is_dead or self.acted_this_turn:
+            return 0
+        status = self.effects._status()
+        if status & STUNNED:
+            return 0
+        count = len(targets)
+        every_target = (1 << count) - 1
+        in_melee = 0
+        for t, target in enumerate(targets):
+            if distance_between(self.position, getattr(target, 'position', target)) <= 1.5:
+                in_melee |= 1 << t
+        cooldowns = self._ability_cooldowns
+        mask = 0
+        for a, ability in enumerate(self.abilities()):
+            if cooldowns.get(ability.name, 0) > 0:
+                continue
+            if (ability.affected_by_root and status & ROOTED) or (ability.affected_by_blind and status & BLINDED):
+                continue
+            mask |= (in_melee if ability.melee else every_target) << (a * count)
+        return mask
+
+    ########################
+    # ~~~ Snapshotting ~~~ #
+    ########################
+
+    def _snapshot(self) -> tuple[dict[str, Any], Any]:
+        'the mutable state of the pawn, for `Level.snapshot()`'
+        return ({key: _copy_state(value) for key, value in self.__dict__.items() if key not in _SNAPSHOT_SKIP},
+                self.effects._snapshot())
+
+    def _restore(self, state: tuple[dict[str, Any], Any]) -> None:
+        attributes, effects = state
+        d = self.__dict__
+        for key in [key for key in d if key not in _SNAPSHOT_SKIP and key not in attributes]:
+            del d[key]
+        for key, value in attributes.items():
+            d[key] = _copy_state(value)
+        self.effects._restore(effects)
+
+    def _fork(self, memo: dict[int, Any]) -> 'Pawn':
+        'the copy of this pawn for `Level.fork()`, sharing its equipment'
+        clone = memo.get(id(self))
+        if clone is None:
+            clone = memo[id(self)] = self.__class__.__new__(self.__class__)
+        clone.__dict__.update({key: _fork_value(value, memo) for key, value in self.__dict__.items()
+                               if key not in ('effects', '_inputs')})
+        clone.effects = self.effects._fork(memo)
+        clone._inputs = None
+        return clone
 
     ####################
     # ~~~ Location ~~~ #
@@ -156,6 +313,7 @@ class Pawn(_Character):
         return self._position
 
     @position.setter
+    @_record_input
     def position(self, value: Union[Point, Tuple[int, int]]) -> None:
         if not self.moved_this_turn:
             self._position = value if isinstance(
@@ -276,6 +434,7 @@ class Pawn(_Character):
     ####################
     # ~~~ Movement ~~~ #
     ####################
+    @_record_input
     def move(self, destination: Point) -> None:
         if not self._is_dead:
             return self.move_toward(destination)
@@ -320,6 +479,7 @@ class Pawn(_Character):
             point.x+(point.x-self.position.x), point.y+(point.y-self.position.y)) # type: ignore
         self.position = point
 
+    @_record_input
     def face(self, target: Union[_Character,Point,tuple[int,int]]) -> None:
         if hasattr(target, 'position'):
             self.facing_direction = next(bresenham(self.position, target.position)) # type: ignore
@@ -397,29 +557,13 @@ class Pawn(_Character):
     def _tick_damage(self, effect: Effect) -> None:
         if effect.damage_over_time > 0:
             self.health -= effect.damage_over_time
-            self.action_history.append(Action(
-                turn=self._turn,
-                type='damage',
-                action_name=f'{effect.name} ticked for {effect.damage_over_time} damage',
-                actor=effect.name,
-                target=self,
-                target_effects=self.effects.to_dict(),
-                ability_used=effect.name,
-                damage=effect.damage_over_time,
-            ))
+            self._log_tick(effect, self._turn, f'{effect.name} ticked for {effect.damage_over_time} damage',
+                           effect.damage_over_time)
         
         if effect.heal_over_time:
             self._heal(effect.heal_over_time)
-            self.action_history.append(Action(
-                turn=self._turn,
-                type='damage',
-                action_name=f'{effect.name} healed for {effect.heal_over_time} health',
-                actor=effect.name,
-                target=self,
-                target_effects=self.effects.to_dict(),
-                ability_used=effect.name,
-                damage=effect.heal_over_time,
-            ))
+            self._log_tick(effect, self._turn, f'{effect.name} healed for {effect.heal_over_time} health',
+                           effect.heal_over_time)
         
         if self.health <= 0:
             if not self._is_already_dead:
@@ -607,26 +751,110 @@ class Pawn(_Character):
         self.effects.add(effect)
 
     def _tick(self) -> None:
-        # apply effects
-        for effect in self.effects:
+        # apply effects; only effects that override a tick hook are dispatched
+        for effect in self.effects._tick_hooked:
             if effect.new:
-                effect.on_create()
+                if 'on_create' in effect._hooks:
+                    effect.on_create()
                 effect.new = False
-            effect.on_tick()
+            if 'on_tick' in effect._hooks:
+                effect.on_tick()
+        for effect in self.effects.get_hot_dot_effects():
             self._tick_damage(effect)
 
-        # TODO: magic vulnerability from fire + frost vuln pair
-        frost = self.effects.find_effect_text('frost resistance')
-        fire = self.effects.find_effect_text('fire resistance')
-        if frost and fire:
-            for ice_effect, fire_effect in zip(frost, fire):
-                self.effects.add(MagicVulnerability())
-                self.effects.remove_one(ice_effect)
-                self.effects.remove_one(fire_effect)
-
         # increment turn counter
         self._turn += 1
 
+    def _log_tick(self, effect: Effect, turn: int, message: str, amount: int) -> None:
+        self.action_history.append(Action(
+            turn=turn,
+            type='damage',
+            action_name=message,
+            actor=effect.name,
+            target=self,
+            target_effects=self.effects.to_dict(),
+            ability_used=effect.name,
+            damage=amount,
+        ))
+
+    def _quiet_turns(self) -> Union[int, float]:
+        '''
+        How many of the coming turns only change this pawn's health (by its DoTs
+        and HoTs), effect durations and cooldowns, in ways `_skip_turns` can work
+        out without ticking: none if it has moved or acted this turn or carries
+        effects with tick hooks or a computed duration, and never as far as an
+        effect expiring, the pawn dying, or max health cutting short a heal that's
+        mixed with damage.
+        '''
+        if self.acted_this_turn or self.moved_this_turn or self.effects._tick_hooked:
+            return 0
+        turns: Union[int, float] = math.inf
+        for effect in self.effects._effects:
+            if isinstance(getattr(type(effect), 'duration', None), property):
+                return 0
+            # expires on the ceil(duration)-th tick from now
+            if effect.duration != math.inf:
+                turns = min(turns, math.ceil(effect.duration) - 1)
+        if self._is_dead or turns <= 0:
+            return max(turns, 0)
+
+        # the health change of one turn, and its lowest and highest points along the way
+        net, lowest, highest = 0, math.inf, -math.inf
+        for effect in self.effects.get_hot_dot_effects():
+            if effect.damage_over_time > 0:
+                net -= effect.damage_over_time
+                lowest = min(lowest, net)
+            if effect.heal_over_time:
+                if effect.heal_over_time < 0:
+                    return 0
+                net += effect.heal_over_time
+                highest = max(highest, net)
+        health = self.health
+        if lowest < math.inf:
+            # no dying; a turn t from now bottoms out at health + t*net + lowest
+            if health + lowest <= 0:
+                return 0
+            if net < 0:
+                turns = min(turns, math.ceil((health + lowest) / -net))
+            if highest > -math.inf:
+                # and no heal capped at max health, unless the heals are all there is
+                if health + highest > self.health_max:
+                    return 0
+                if net > 0:
+                    turns = min(turns, math.floor((self.health_max - health - highest) / net) + 1)
+        return turns
+
+    def _skip_turns(self, turns: int) -> None:
+        '''
+        What `turns` turns of `_tick` and `_post_tick` would do to the pawn, worked
+        out directly; only for up to `_quiet_turns()` turns.
+        '''
+        ticking = self.effects.get_hot_dot_effects()
+        for turn in range(self._turn, self._turn + turns):
+            for effect in ticking:
+                if effect.damage_over_time > 0:
+                    self._log_tick(effect, turn, f'{effect.name} ticked for {effect.damage_over_time} damage',
+                                   effect.damage_over_time)
+                if effect.heal_over_time:
+                    self._log_tick(effect, turn, f'{effect.name} healed for {effect.heal_over_time} health',
+                                   effect.heal_over_time)
+        if not self._is_dead and ticking:
+            damage = sum(effect.damage_over_time for effect in ticking if effect.damage_over_time > 0)
+            healing = sum(effect.heal_over_time for effect in ticking)
+            if damage:
+                # `_quiet_turns` stops before a heal in the mix would hit max health
+                self.health += turns * (healing - damage)
+            else:
+                self.health = min(self.health + turns * healing, self.health_max)
+        self._turn += turns
+
+        self.effects._skip(turns)
+        for name, cooldown in self._ability_cooldowns.items():
+            if cooldown > 0:
+                self._ability_cooldowns[name] = max(cooldown - turns, 0)
+        self._was_hit = False
+        self.current_action = None
+
     def _post_tick(self) -> None:
         # tick self.effects
         self.effects._tick()  # updates durations and removes expired effects
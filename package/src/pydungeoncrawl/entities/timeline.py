@@ -0,0 +1,118 @@
+"""
+A boss's mechanics, declared up front so that the engine, `Level.fast_forward()`
+and the party's code can all tell when the next one goes off:
+
+    self.timeline.every('devour souls', 5)                  # turns 5, 10, 15, ...
+    self.timeline.when('strike', lambda boss: boss.telegraph)
+
+    if self.timeline.due('devour souls', self._turn, self):
+        ...
+
+Turns are the boss's own `_turn`s, as `_tick_logic` sees them. A mechanic due on
+turn T goes off in the engine turn right after the party's turn T.
+
+A periodic mechanic is due every `period` turns from `start`. A conditional one
+is due on every turn its condition holds; conditions take the boss and should
+only look at the boss's own state, which changes only when the boss acts, so a
+condition that doesn't hold now won't hold before some other mechanic has gone
+off. A mechanic can be both: due on its periodic turns when its condition holds.
+"""
+import heapq
+import math
+from typing import Any, Callable, NamedTuple, Union
+
+
+class Mechanic(NamedTuple):
+    name: str
+    period: Union[int, None]
+    start: int
+    condition: Union[Callable[[Any], Any], None]
+
+    def next_turn(self, after: int) -> int:
+        'the first periodic turn after `after`'
+        if after < self.start:
+            return self.start
+        return after + self.period - (after - self.start) % self.period  # type: ignore[operator]
+
+
+class Timeline:
+    def __init__(self) -> None:
+        self.mechanics: dict[str, Mechanic] = {}
+        self._periodic: list[Mechanic] = []
+        self._conditional: list[Mechanic] = []
+        # the next turn of every periodic mechanic after `_after`, kept as a heap of (turn, index)
+        self._heap: list[tuple[int, int]] = []
+        self._after: Union[int, None] = None
+
+    def every(self, name: str, period: int, start: Union[int, None] = None,
+              condition: Union[Callable[[Any], Any], None] = None) -> Mechanic:
+        'register a mechanic that is due every `period` turns from turn `start` (by default, `period`)'
+        if period < 1:
+            raise ValueError("period must be at least 1")
+        return self._add(Mechanic(name, period, period if start is None else start, condition))
+
+    def when(self, name: str, condition: Callable[[Any], Any]) -> Mechanic:
+        'register a mechanic that is due on every turn `condition(boss)` holds'
+        return self._add(Mechanic(name, None, 0, condition))
+
+    def _add(self, mechanic: Mechanic) -> Mechanic:
+        if mechanic.name in self.mechanics:
+            raise ValueError(f"There's already a mechanic called {mechanic.name!r}")
+        self.mechanics[mechanic.name] = mechanic
+        if mechanic.period is None:
+            self._conditional.append(mechanic)
+        else:
+            self._periodic.append(mechanic)
+            self._after = None
+        return mechanic
+
+    def due(self, name: str, turn: int, boss: Any = None) -> bool:
+        'whether the mechanic goes off on `turn`'
+        mechanic = self.mechanics[name]
+        if mechanic.period is not None and (turn < mechanic.start or (turn - mechanic.start) % mechanic.period):
+            return False
+        return mechanic.condition is None or bool(mechanic.condition(boss))
+
+    def next_turn(self, after: int, boss: Any = None) -> Union[int, float]:
+        '''
+        The first turn after `after` on which a mechanic may go off: the next turn
+        if a conditional mechanic's condition holds, otherwise the next periodic
+        turn (infinity if there are none). Amortized O(log n) in the number of
+        periodic mechanics as the turns go by.
+        '''
+        if any(mechanic.condition(boss) for mechanic in self._conditional):  # type: ignore[misc]
+            return after + 1
+        heap = self._heap
+        if self._after is None or after < self._after:
+            # first call, or the level was restored to an earlier turn
+            heap[:] = [(mechanic.next_turn(after), i) for i, mechanic in enumerate(self._periodic)]
+            heapq.heapify(heap)
+        else:
+            while heap and heap[0][0] <= after:
+                _, i = heap[0]
+                heapq.heapreplace(heap, (self._periodic[i].next_turn(after), i))
+        self._after = after
+        return heap[0][0] if heap else math.inf
+
+    def upcoming(self, after: int, count: int = 5, boss: Any = None) -> list[tuple[int, str]]:
+        '''
+        The next `count` (turn, name) events after turn `after`, in order: the
+        conditional mechanics whose conditions hold now (due next turn), then the
+        periodic ones. Periodic mechanics with a condition are listed whether or
+        not it will hold.
+        '''
+        events = [(after + 1, mechanic.name) for mechanic in self._conditional if mechanic.condition(boss)]  # type: ignore[misc]
+        heap = [(mechanic.next_turn(after), i) for i, mechanic in enumerate(self._periodic)]
+        heapq.heapify(heap)
+        while heap and len(events) < count:
+            turn, i = heap[0]
+            events.append((turn, self._periodic[i].name))
+            heapq.heapreplace(heap, (self._periodic[i].next_turn(turn), i))
+        return events[:count]
+
+    def _fork(self, memo: dict[int, Any]) -> 'Timeline':
+        'a copy for `Level.fork()`, with a cache of its own; the mechanics are shared'
+        clone = Timeline.__new__(Timeline)
+        clone.__dict__.update(self.__dict__)
+        clone._heap = self._heap.copy()
+        return clone
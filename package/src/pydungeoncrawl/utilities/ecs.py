@@ -0,0 +1,516 @@
+"""
+An entity-component store for encounters with many monsters. A level still
+has its one boss; the store holds a swarm alongside it, as rows of NumPy arrays
+instead of one `Monster` object each:
+
+    store = EntityStore(level.board, abilities=('bite',))
+    rats = [store.add(f'Rat {i}', point, health_max=30) for i, point in enumerate(spawns)]
+    for turn in level:
+        ...                                     # the party's code, as usual
+        tank = level.party.tank
+        store.move_toward(tank.position)
+        biting = store.use(store.within(tank.position, 1.5), 'bite', cooldown=2)
+        store.attack(biting, tank, 5)
+        store.tick()
+
+The components are the columns `x`, `y`, `facing` (`(n, 2)` steps), `health`,
+`health_max`, `dead`, `status` (the STUNNED, BLINDED and ROOTED bits of
+`entities.effects`) and `cooldowns` (`(n, len(abilities))` turns left). They're
+views of the first `len(store)` rows and can be read and written directly.
+Effects are rows of a table of their own: bearer, damage and healing per turn,
+turns left and status bits.
+
+The systems update every entity at once:
+
+- `move_toward(targets)` steps each entity that can move one square toward its
+  target;
+- `hazard_damage()` burns the entities standing in fire or lava;
+- `tick_effects()` applies the DoTs and HoTs, counts the effects down and works
+  out `status` again;
+- `tick_cooldowns()` counts the cooldowns down;
+- `tick()` runs the last three, in the engine's order.
+
+`attack(indexes, pawn, damage)` has the entities hit a hero, one hit each, as a
+monster would: the hero's barriers, armor and reflects apply to every hit.
+
+`store[i]` and the views `add` returns are `EntityView`s with the `Pawn` API for
+what the store keeps (`position`, `health`, `is_alive`, `cooldowns`, `stunned`,
+`distance_to()`, ...), so targeting code written for pawns works on them. They
+can also take damage, e.g. reflected damage. They don't have effects or gear,
+so the heroes' abilities can't target them.
+
+Entities aren't placed on the `Board`. The store keeps its own occupancy grid,
+and treats the board's walls, lava and occupied squares as blocked. It reads the
+terrain once and then only the squares that change (`Board._watch()`), so the
+party walks through the swarm but the swarm walks around the party. The board
+still draws them (`Board._show()`): `str(level)`, the renderers and the Recorder
+show each entity's symbol, or 💀 once it's dead, on any square without a pawn.
+
+NumPy is required: `pip install pydungeoncrawl[training]`.
+"""
+from typing import Any, Sequence, Union
+
+try:
+    import numpy as np
+except ModuleNotFoundError:
+    np = None
+
+from ..entities.board import LazyBoard, Square
+from ..entities.effects import BLINDED, ROOTED, STUNNED, Effect
+from .location import Point, clean_name, distance_between
+
+
+# column: (dtype, shape of one row)
+_COLUMNS = {
+    'x': ('int32', ()),
+    'y': ('int32', ()),
+    'facing': ('int8', (2,)),
+    'health': ('int64', ()),
+    'health_max': ('int64', ()),
+    'dead': ('bool', ()),
+    'status': ('uint8', ()),
+}
+
+_EFFECT_COLUMNS = {
+    'bearer': ('int32', ()),
+    'damage': ('int64', ()),
+    'healing': ('int64', ()),
+    'remaining': ('float64', ()),
+    'status': ('uint8', ()),
+}
+
+_STATUS_NAMES = {'stun': STUNNED, 'blind': BLINDED, 'root': ROOTED}
+
+
+def _grow(arrays: dict[str, 'np.ndarray'], columns: dict[str, tuple[str, tuple]], capacity: int) -> None:
+    'reallocate every column with room for `capacity` rows, keeping what they hold'
+    for name, (dtype, shape) in columns.items():
+        grown = np.zeros((capacity, *shape), dtype=dtype)
+        old = arrays.get(name)
+        if old is not None:
+            grown[:len(old)] = old
+        arrays[name] = grown
+
+
+class EntityStore:
+    def __init__(self, board, abilities: Sequence[str] = (), capacity: int = 64) -> None:
+        if np is None:
+            raise ModuleNotFoundError("EntityStore needs NumPy: pip install pydungeoncrawl[training]")
+        self.board = board
+        # cooldown names as `Pawn._ability_cooldowns` spells them
+        self.abilities = tuple(clean_name(name) for name in abilities)
+        self._slots = {name: i for i, name in enumerate(self.abilities)}
+        self.names: list[str] = []
+        self.symbols: list[str] = []
+        self._views: list[EntityView] = []
+
+        self._rows: dict[str, Any] = {}
+        _grow(self._rows, {**_COLUMNS, 'cooldowns': ('int32', (len(self.abilities),))}, max(capacity, 1))
+        self._effects: dict[str, Any] = {}
+        _grow(self._effects, _EFFECT_COLUMNS, max(capacity, 1))
+        self._effect_count = 0
+
+        height, width = board.height, board.width
+        # walls, lava and squares that hold a pawn; the damage of fire and lava; the swarm's squares
+        self._blocked = np.zeros((height, width), dtype=bool)
+        self._hazard = np.zeros((height, width), dtype=np.int64)
+        self._occupied = np.zeros((height, width), dtype=bool)
+        self._read_terrain()
+        self._changed = board._watch()
+        board._show(self)
+
+    def close(self) -> None:
+        'stop watching the board, and take the entities off it'
+        self.board._unwatch(self._changed)
+        self.board._hide(self)
+
+    def _symbols(self) -> list[tuple[int, int, str]]:
+        'the (x, y, symbol) of every entity, for `Board._symbol_rows()`'
+        return [(int(x), int(y), '💀' if dead else symbol)
+                for x, y, dead, symbol in zip(self.x, self.y, self.dead, self.symbols)]
+
+    #################
+    # ~~ Terrain ~~ #
+    #################
+
+    def _read_terrain(self) -> None:
+        board = self.board
+        if isinstance(board, LazyBoard):
+            # the whole template in one lookup, then the squares created so far on top
+            template = board._template
+            blocked = np.array([tile.impassable or tile.is_lava for tile in template.palette], dtype=bool)
+            hazard = np.array([tile.damage if tile.is_burning or tile.is_lava else 0 for tile in template.palette],
+                              dtype=np.int64)
+            tiles = np.frombuffer(template.tiles, dtype=np.uint8).reshape(board.height, board.width)  # type: ignore[call-overload]
+            self._blocked[:] = blocked[tiles]
+            self._hazard[:] = hazard[tiles]
+            squares = board._live_squares()
+        else:
+            squares = (square for row in board.grid for square in row)
+        for square in squares:
+            self._read_square(square)
+
+    def _read_square(self, square: Square) -> None:
+        x, y = square.position.x, square.position.y
+        self._blocked[y, x] = square.impassable or square.is_lava
+        self._hazard[y, x] = square.damage if square.is_burning or square.is_lava else 0
+
+    def _sync(self) -> None:
+        'catch up with the squares that changed since the last system ran'
+        changed = self._changed
+        if changed:
+            for square in changed:
+                self._read_square(square)
+            changed.clear()
+
+    ##################
+    # ~~ Entities ~~ #
+    ##################
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, index: int) -> 'EntityView':
+        return self._views[index]
+
+    def __iter__(self):
+        return iter(self._views)
+
+    def _column(self, name: str) -> 'np.ndarray':
+        return self._rows[name][:len(self.names)]
+
+    @property
+    def x(self) -> 'np.ndarray':
+        return self._column('x')
+
+    @property
+    def y(self) -> 'np.ndarray':
+        return self._column('y')
+
+    @property
+    def facing(self) -> 'np.ndarray':
+        return self._column('facing')
+
+    @property
+    def health(self) -> 'np.ndarray':
+        return self._column('health')
+
+    @property
+    def health_max(self) -> 'np.ndarray':
+        return self._column('health_max')
+
+    @property
+    def dead(self) -> 'np.ndarray':
+        return self._column('dead')
+
+    @property
+    def status(self) -> 'np.ndarray':
+        return self._column('status')
+
+    @property
+    def cooldowns(self) -> 'np.ndarray':
+        return self._column('cooldowns')
+
+    @property
+    def alive(self) -> 'np.ndarray':
+        return ~self.dead
+
+    def add(self, name: str, position: Union[Point, tuple[int, int]], health_max: int = 500,
+            symbol: str = '👹') -> 'EntityView':
+        'add an entity at `position`, which must be free; returns its view'
+        x, y = position[0], position[1]
+        if not (0 <= x < self.board.width and 0 <= y < self.board.height):
+            raise ValueError(f"{position} is off the board")
+        self._sync()
+        if self._blocked[y, x] or self._occupied[y, x]:
+            raise ValueError(f"The square at {position} isn't free")
+        index = len(self.names)
+        if index == len(self._rows['x']):
+            _grow(self._rows, {**_COLUMNS, 'cooldowns': ('int32', (len(self.abilities),))}, 2 * index)
+        rows = self._rows
+        rows['x'][index], rows['y'][index] = x, y
+        rows['facing'][index] = 0
+        rows['health'][index] = rows['health_max'][index] = health_max
+        rows['dead'][index] = False
+        rows['status'][index] = 0
+        rows['cooldowns'][index] = 0
+        self._occupied[y, x] = True
+        self.names.append(name)
+        self.symbols.append(symbol)
+        view = EntityView(self, index)
+        self._views.append(view)
+        return view
+
+    def damage(self, indexes: Any, amounts: Any) -> None:
+        '''
+        Take `amounts` off the health of the living entities at `indexes` (an index
+        or an array of them; an index can repeat). Negative amounts heal, up to
+        max health. Entities that reach 0 health die.
+        '''
+        indexes = np.atleast_1d(np.asarray(indexes, dtype=np.intp))
+        total = np.zeros(len(self), dtype=np.int64)
+        np.add.at(total, indexes, np.broadcast_to(np.asarray(amounts, dtype=np.int64), indexes.shape))
+        self._change_health(-total)
+
+    def _change_health(self, change: 'np.ndarray') -> None:
+        health, dead = self.health, self.dead
+        living = ~dead
+        health[living] = np.minimum(health[living] + change[living], self.health_max[living])
+        died = living & (health <= 0)
+        health[died] = 0
+        dead |= died
+
+    def attack(self, indexes: Any, target: Any, damage: int, damage_type: str = 'physical') -> 'np.ndarray':
+        '''
+        Have the living entities at `indexes` each hit `target` (a `Pawn`) for
+        `damage`, as `Pawn._take_damage` does it for a monster's hit. Returns the
+        indexes of the entities that hit.
+        '''
+        indexes = np.atleast_1d(np.asarray(indexes, dtype=np.intp))
+        hitting = indexes[~self.dead[indexes]]
+        for index in hitting:
+            if not target.is_alive:
+                break
+            target._take_damage(self._views[index], damage, damage_type)
+        return hitting
+
+    def within(self, point: Union[Point, tuple[int, int]], radius: float) -> 'np.ndarray':
+        'the indexes of the living entities at most `radius` squares from `point`, as `distance_between` measures'
+        dx, dy = self.x - point[0], self.y - point[1]
+        return np.flatnonzero(self.alive & (dx * dx + dy * dy <= radius * radius))
+
+    def nearest(self, point: Union[Point, tuple[int, int]]) -> Union['EntityView', None]:
+        'the living entity closest to `point`, or None'
+        alive = np.flatnonzero(self.alive)
+        if not len(alive):
+            return None
+        dx, dy = self.x[alive] - point[0], self.y[alive] - point[1]
+        return self._views[int(alive[np.argmin(dx * dx + dy * dy)])]
+
+    def use(self, indexes: Any, ability: str, cooldown: int = 1) -> 'np.ndarray':
+        '''
+        Have the entities at `indexes` use `ability`: the ones that are alive, not
+        stunned and not waiting on its cooldown go on cooldown for `cooldown` turns,
+        and their indexes are returned.
+        '''
+        slot = self._slots[clean_name(ability)]
+        indexes = np.unique(np.atleast_1d(np.asarray(indexes, dtype=np.intp)))
+        cooldowns = self.cooldowns
+        ready = indexes[~self.dead[indexes] & ~(self.status[indexes] & STUNNED).astype(bool)
+                        & (cooldowns[indexes, slot] == 0)]
+        cooldowns[ready, slot] = cooldown
+        return ready
+
+    def add_effect(self, indexes: Any, effect: Effect) -> None:
+        '''
+        Put a copy of `effect`'s numbers on each entity at `indexes`: its damage and
+        healing over time, its duration, and whether it stuns, blinds or roots.
+        The effect's hooks and other bonuses don't apply to entities.
+        '''
+        indexes = np.atleast_1d(np.asarray(indexes, dtype=np.intp))
+        start, count = self._effect_count, len(indexes)
+        if start + count > len(self._effects['bearer']):
+            _grow(self._effects, _EFFECT_COLUMNS, max(2 * len(self._effects['bearer']), start + count))
+        rows = slice(start, start + count)
+        effects = self._effects
+        effects['bearer'][rows] = indexes
+        effects['damage'][rows] = max(effect.damage_over_time, 0)
+        effects['healing'][rows] = effect.heal_over_time
+        effects['remaining'][rows] = effect.duration
+        bits = _STATUS_NAMES.get(effect.name.lower(), 0)
+        effects['status'][rows] = bits
+        self._effect_count += count
+        self.status[indexes] |= bits
+
+    def effects_on(self, index: int) -> dict[str, 'np.ndarray']:
+        "the rows of the effect table on entity `index`"
+        count = self._effect_count
+        mine = self._effects['bearer'][:count] == index
+        return {name: column[:count][mine] for name, column in self._effects.items()}
+
+    #################
+    # ~~ Systems ~~ #
+    #################
+
+    def move_toward(self, targets: Any) -> 'np.ndarray':
+        '''
+        Step every entity that can move (alive, not stunned or rooted, not there
+        yet) one square toward its target: `targets` is one point for all of them,
+        or an `(n, 2)` array of x, y. An entity tries the diagonal step first, then
+        the step along x alone and the one along y alone, and takes the first that's
+        on the board and free. Entities move at the same time: a square being left
+        this turn is still taken, and of two entities stepping into the same square
+        the one added first gets it. Returns the indexes of the entities that moved.
+        '''
+        self._sync()
+        n = len(self)
+        if isinstance(targets, Point):
+            targets = (targets.x, targets.y)
+        targets = np.asarray(targets)
+        x, y = self.x, self.y
+        sx = np.sign(np.broadcast_to(targets[..., 0], (n,)) - x).astype(np.int32)
+        sy = np.sign(np.broadcast_to(targets[..., 1], (n,)) - y).astype(np.int32)
+        pending = (~self.dead & ~(self.status & (STUNNED | ROOTED)).astype(bool) & ((sx != 0) | (sy != 0)))
+
+        height, width = self._blocked.shape
+        taken = (self._blocked | self._occupied).ravel().copy()
+        movers, new_x, new_y = [], [], []
+        for step_x, step_y in ((sx, sy), (sx, 0 * sy), (0 * sx, sy)):
+            nx, ny = x + step_x, y + step_y
+            candidates = pending & ((step_x != 0) | (step_y != 0)) & (0 <= nx) & (nx < width) & (0 <= ny) & (ny < height)
+            order = np.flatnonzero(candidates)
+            cells = ny[order] * width + nx[order]
+            free = ~taken[cells]
+            order, cells = order[free], cells[free]
+            # the first (lowest index) entity to claim a square gets it
+            cells, first = np.unique(cells, return_index=True)
+            winners = order[first]
+            taken[cells] = True
+            pending[winners] = False
+            movers.append(winners)
+            new_x.append(nx[winners])
+            new_y.append(ny[winners])
+
+        moved = np.concatenate(movers)
+        to_x, to_y = np.concatenate(new_x), np.concatenate(new_y)
+        self._occupied[y[moved], x[moved]] = False
+        self._occupied[to_y, to_x] = True
+        self.facing[moved, 0] = to_x - x[moved]
+        self.facing[moved, 1] = to_y - y[moved]
+        x[moved], y[moved] = to_x, to_y
+        return np.sort(moved)
+
+    def hazard_damage(self) -> None:
+        'burn the living entities standing in fire or lava, by the damage of their squares'
+        self._sync()
+        self._change_health(-self._hazard[self.y, self.x])
+
+    def tick_effects(self) -> None:
+        '''
+        One turn of the effect table: every living entity takes the damage and the
+        healing of its effects (the net change, capped at max health), then every
+        effect counts down and the ones that run out are dropped, and `status` is
+        worked out from the ones left.
+        '''
+        count = self._effect_count
+        effects = self._effects
+        bearer = effects['bearer'][:count]
+        if count:
+            change = np.bincount(bearer, weights=effects['healing'][:count] - effects['damage'][:count],
+                                 minlength=len(self))
+            self._change_health(change.astype(np.int64))
+
+            remaining = effects['remaining'][:count]
+            remaining -= 1
+            keep = np.flatnonzero(remaining > 0)
+            for column in effects.values():
+                column[:len(keep)] = column[:count][keep]
+            self._effect_count = count = len(keep)
+            bearer = effects['bearer'][:count]
+
+        status = self.status
+        status[:] = 0
+        np.bitwise_or.at(status, bearer, effects['status'][:count])
+
+    def tick_cooldowns(self) -> None:
+        'count every cooldown down by a turn'
+        cooldowns = self.cooldowns
+        np.subtract(cooldowns, 1, out=cooldowns, where=cooldowns > 0)
+
+    def tick(self) -> None:
+        'the end of a turn for the whole swarm: effects, cooldowns, then fire and lava'
+        self.tick_effects()
+        self.tick_cooldowns()
+        self.hazard_damage()
+
+
+class EntityView:
+    'one entity of an `EntityStore`, with the parts of the `Pawn` API the store keeps'
+    __slots__ = ('store', 'index')
+
+    def __init__(self, store: EntityStore, index: int) -> None:
+        self.store = store
+        self.index = index
+
+    @property
+    def name(self) -> str:
+        return self.store.names[self.index]
+
+    @property
+    def symbol(self) -> str:
+        return self.store.symbols[self.index] if self.is_alive else "💀"
+
+    @property
+    def position(self) -> Point:
+        store, i = self.store, self.index
+        return Point(int(store._rows['x'][i]), int(store._rows['y'][i]))
+
+    @property
+    def facing_direction(self) -> Point:
+        facing = self.store._rows['facing'][self.index]
+        return Point(int(facing[0]), int(facing[1]))
+
+    @property
+    def health(self) -> int:
+        return int(self.store._rows['health'][self.index])
+
+    @health.setter
+    def health(self, value: int) -> None:
+        rows, i = self.store._rows, self.index
+        if not rows['dead'][i]:
+            rows['health'][i] = max(value, 0)
+            rows['dead'][i] = value <= 0
+
+    @property
+    def health_max(self) -> int:
+        return int(self.store._rows['health_max'][self.index])
+
+    @property
+    def health_percent(self) -> float:
+        return round(self.health / self.health_max, 2)
+
+    @property
+    def is_alive(self) -> bool:
+        return not self.store._rows['dead'][self.index]
+
+    @property
+    def stunned(self) -> bool:
+        return bool(self.store._rows['status'][self.index] & STUNNED)
+
+    @property
+    def blinded(self) -> bool:
+        return bool(self.store._rows['status'][self.index] & BLINDED)
+
+    @property
+    def rooted(self) -> bool:
+        return bool(self.store._rows['status'][self.index] & ROOTED)
+
+    @property
+    def cooldowns(self) -> dict[str, int]:
+        row = self.store._rows['cooldowns'][self.index]
+        return {name: int(turns) for name, turns in zip(self.store.abilities, row) if turns > 0}
+
+    def is_on_cooldown(self, ability_name: str) -> bool:
+        return self.get_cooldown(ability_name) > 0
+
+    def get_cooldown(self, ability_name: str) -> int:
+        slot = self.store._slots.get(clean_name(ability_name))
+        return 0 if slot is None else int(self.store._rows['cooldowns'][self.index, slot])
+
+    def distance_to(self, other: Any) -> float:
+        if isinstance(other, tuple):
+            other = Point(*other)
+        return distance_between(self.position, other if isinstance(other, Point) else other.position)
+
+    def distance_from(self, other: Any) -> float:
+        return self.distance_to(other)
+
+    def _take_damage(self, damager: Any, damage: int, damage_type: str, ability=False, ability_name="") -> None:
+        if damage > 0:
+            self.store.damage(self.index, damage)
+
+    def __repr__(self) -> str:
+        return f"{self.name} (Monster), {self.health}/{self.health_max} HP"
+
+    def __str__(self) -> str:
+        return self.__repr__()
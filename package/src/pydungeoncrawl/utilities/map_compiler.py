@@ -0,0 +1,188 @@
+"""
+Compile map images into the compact `.pdcmap` format.
+
+Each pixel colour is a tile type (see `map_making._TILE_MAP`). The whole image
+is converted to tile ids in one vectorised lookup (with NumPy when it's
+installed), validated, and written with `MapTemplate.save`. Whole directories
+of source images are compiled in parallel:
+
+    python -m pydungeoncrawl.utilities.map_compiler maps/ compiled/
+"""
+import argparse
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Union
+
+try:
+    import numpy as np
+except ModuleNotFoundError:
+    np = None
+
+from .location import Point
+from .map_format import BOSS_SPAWN, EXTENSION, PARTY_SPAWN, MapTemplate, TileType
+from .map_making import _TILE_MAP
+
+
+IMAGE_EXTENSIONS = ('.tif', '.tiff', '.png', '.bmp', '.gif')
+
+# the same palette for every compiled image, in `_TILE_MAP` order
+PALETTE = tuple(TileType(**tile) for tile in _TILE_MAP.values())
+_COLOR_IDS = {color: tile_id for tile_id, color in enumerate(_TILE_MAP)}
+_UNKNOWN = 255
+
+_PARTY_ID = next(i for i, tile in enumerate(PALETTE) if tile.symbol == PARTY_SPAWN)
+_BOSS_ID = next(i for i, tile in enumerate(PALETTE) if tile.symbol == BOSS_SPAWN)
+
+_NEIGHBORS = ((0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1))
+
+# the party needs a spawn square for each of its four members
+PARTY_SIZE = 4
+
+
+def _tile_ids(rgb: bytes, width: int, height: int) -> tuple[bytes, set[tuple[int, int, int]]]:
+    '''
+    Convert packed RGB pixel data (top row first) into tile ids (bottom row first, so
+    that row index == board y). Returns the tile ids and the set of unknown colours.
+    '''
+    if np is not None:
+        pixels = np.frombuffer(rgb, dtype=np.uint8).reshape(height, width, 3).astype(np.uint32)
+        keys = (pixels[..., 0] << 16) | (pixels[..., 1] << 8) | pixels[..., 2]
+        colors, inverse = np.unique(keys, return_inverse=True)
+        rgbs = [((int(c) >> 16) & 255, (int(c) >> 8) & 255, int(c) & 255) for c in colors]
+        lookup = np.array([_COLOR_IDS.get(color, _UNKNOWN) for color in rgbs], dtype=np.uint8)
+        ids = lookup[inverse.reshape(height, width)][::-1]
+        unknown = {color for color in rgbs if color not in _COLOR_IDS}
+        return ids.tobytes(), unknown
+
+    ids = bytes(_COLOR_IDS.get(color, _UNKNOWN) for color in zip(rgb[0::3], rgb[1::3], rgb[2::3]))
+    unknown = set()
+    if _UNKNOWN in ids:
+        unknown = {color for color in set(zip(rgb[0::3], rgb[1::3], rgb[2::3])) if color not in _COLOR_IDS}
+    return b''.join(ids[y * width:(y + 1) * width] for y in range(height - 1, -1, -1)), unknown
+
+
+def _find_all(tiles: bytes, tile_id: int, width: int) -> tuple[Point, ...]:
+    'positions of every tile with the given id, in board order (by y, then x)'
+    points = []
+    index = tiles.find(tile_id)
+    while index != -1:
+        points.append(Point(index % width, index // width))
+        index = tiles.find(tile_id, index + 1)
+    return tuple(points)
+
+
+def image_to_template(read_loc: str) -> MapTemplate:
+    'convert a map image into a MapTemplate; raises ValueError for colours without a tile type'
+    from PIL import Image
+
+    with Image.open(read_loc, 'r') as im:
+        width, height = im.size
+        tiles, unknown = _tile_ids(im.convert('RGB').tobytes(), width, height)
+
+    if unknown:
+        raise ValueError(f"{read_loc}: unknown colours {sorted(unknown)}")
+
+    party_spawns = _find_all(tiles, _PARTY_ID, width)
+    bosses = _find_all(tiles, _BOSS_ID, width)
+    return MapTemplate(width, height, PALETTE, tiles, party_spawns, bosses[0] if bosses else None)
+
+
+def validate_template(template: MapTemplate) -> list[str]:
+    '''
+    Check that a map is playable: it has a boss spawn and enough party spawns, and
+    every party spawn can be reached from the boss spawn the way `Boss._astar` walks
+    (eight directions, around impassable squares and lava). Returns a list of problems.
+    '''
+    problems = []
+    if template.boss_spawn is None:
+        problems.append(f"no boss spawn ({BOSS_SPAWN})")
+    if len(template.party_spawns) < PARTY_SIZE:
+        problems.append(f"{len(template.party_spawns)} party spawns ({PARTY_SPAWN}), need {PARTY_SIZE}")
+    if template.boss_spawn is None or not template.party_spawns:
+        return problems
+
+    width, height = template.width, template.height
+    blocked = [tile.impassable or tile.is_lava for tile in template.palette]
+    tiles = template.tiles
+    start = template.boss_spawn.y * width + template.boss_spawn.x
+    seen = bytearray(width * height)
+    seen[start] = 1
+    queue = deque([(template.boss_spawn.x, template.boss_spawn.y)])
+    while queue:
+        x, y = queue.popleft()
+        for i, j in _NEIGHBORS:
+            nx, ny = x + i, y + j
+            if 0 <= nx < width and 0 <= ny < height:
+                index = ny * width + nx
+                if not seen[index] and not blocked[tiles[index]]:
+                    seen[index] = 1
+                    queue.append((nx, ny))
+
+    for point in template.party_spawns:
+        if not seen[point.y * width + point.x]:
+            problems.append(f"party spawn {point} can't be reached from the boss spawn {template.boss_spawn}")
+    return problems
+
+
+def compile_image(read_loc: str, save_loc: str = '') -> MapTemplate:
+    '''
+    Compile a map image, validate it, and write it to `save_loc` if one is given.
+    Raises ValueError listing every problem when the map isn't valid.
+    '''
+    template = image_to_template(read_loc)
+    problems = validate_template(template)
+    if problems:
+        raise ValueError(f"{read_loc}: " + "; ".join(problems))
+    if save_loc:
+        template.save(save_loc)
+    return template
+
+
+def _compile_file(read_loc: str, save_loc: str) -> list[str]:
+    try:
+        compile_image(read_loc, save_loc)
+    except (ValueError, OSError) as error:
+        return [str(error)]
+    return []
+
+
+def compile_directory(source_dir: str, output_dir: str = '', workers: Union[int, None] = None) -> dict[str, list[str]]:
+    '''
+    Compile every map image in `source_dir` into `output_dir` (default: next to the
+    images) using a pool of worker processes. Returns the problems found for each
+    image; images with problems are not written.
+    '''
+    output_dir = output_dir or source_dir
+    os.makedirs(output_dir, exist_ok=True)
+    names = sorted(name for name in os.listdir(source_dir) if name.lower().endswith(IMAGE_EXTENSIONS))
+    jobs = [(os.path.join(source_dir, name), os.path.join(output_dir, os.path.splitext(name)[0] + EXTENSION))
+            for name in names]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(_compile_file, *zip(*jobs)) if jobs else []
+        return dict(zip(names, results))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compile map images into .pdcmap files.")
+    parser.add_argument('source', help='a map image or a directory of map images')
+    parser.add_argument('output', nargs='?', default='', help='output file or directory')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='number of worker processes')
+    args = parser.parse_args(argv)
+
+    if os.path.isdir(args.source):
+        results = compile_directory(args.source, args.output, args.workers)
+    else:
+        output = args.output or os.path.splitext(args.source)[0] + EXTENSION
+        results = {os.path.basename(args.source): _compile_file(args.source, output)}
+
+    failed = 0
+    for name, problems in results.items():
+        print('; '.join(problems) if problems else f"{name}: ok")
+        failed += bool(problems)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
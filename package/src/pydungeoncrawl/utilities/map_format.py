@@ -0,0 +1,259 @@
+"""
+Compact binary map format and an in-process cache of parsed maps.
+
+A compiled map (`.pdcmap`) is laid out as (all integers little-endian):
+
+    header   4s magic b'PDCM', u8 version, u16 width, u16 height,
+             u8 palette size (0 means 256)
+    palette  per tile type: u8 symbol length, utf-8 symbol, u8 flags, i32 damage
+             flags: 1 impassable, 2 burning, 4 lava, 8 water
+    spawns   u8 party spawn count, (u16 x, u16 y) per party spawn,
+             u16 x, u16 y boss spawn (0xFFFF, 0xFFFF if there is none)
+    tiles    width * height u8 palette indices, row by row starting at y = 0
+
+`get_template` parses each map once per process; `MapTemplate.to_board` then
+builds a fresh `Board` from the parsed template without touching the file again.
+
+For maps too big to build every square up front, `MapTemplate.open` memory-maps
+the file and `to_lazy_board()` gives a `LazyBoard` that creates squares on demand.
+"""
+import json
+import mmap
+import struct
+from functools import lru_cache
+from typing import NamedTuple, Union
+
+try:
+    import importlib.resources as resources
+except ImportError:
+    # Try backported to PY<37 `importlib_resources`.
+    import importlib_resources as resources # type: ignore
+
+from . import base_maps
+
+from ..entities.board import Square, Board, LazyBoard
+from .location import Point
+
+
+MAGIC = b'PDCM'
+VERSION = 1
+EXTENSION = '.pdcmap'
+
+PARTY_SPAWN = '🟢'
+BOSS_SPAWN = '🔴'
+
+_HEADER = struct.Struct('<4sBHHB')
+_TILE = struct.Struct('<Bi')
+_POINT = struct.Struct('<HH')
+_NO_SPAWN = 0xFFFF
+
+_IMPASSABLE, _BURNING, _LAVA, _WATER = 1, 2, 4, 8
+
+
+class TileType(NamedTuple):
+    symbol: str
+    impassable: bool = False
+    is_burning: bool = False
+    is_lava: bool = False
+    is_water: bool = False
+    damage: int = 0
+
+    @classmethod
+    def from_square(cls, square: Square) -> 'TileType':
+        return cls(square._symbol, square._impassable, square.is_burning,
+                   square.is_lava, square.is_water, square.damage)
+
+    def to_square(self, position: Point) -> Square:
+        return Square(position, self.symbol, self.impassable, self.is_water,
+                      self.is_burning, self.is_lava, self.damage)
+
+
+class MapTemplate:
+    '''
+    An immutable, parsed map: a palette of `TileType`s, one palette index per
+    cell (row-major, starting at y = 0), and the spawn points.
+
+    Use `to_board()` to get a new `Board` to play on.
+    '''
+
+    def __init__(self, width: int, height: int, palette: tuple[TileType, ...], tiles: Union[bytes, memoryview],
+                 party_spawns: tuple[Point, ...] = (), boss_spawn: Union[Point, None] = None) -> None:
+        if len(tiles) != width * height:
+            raise ValueError(f"Expected {width * height} tiles, got {len(tiles)}")
+        if len(palette) > 256:
+            raise ValueError("A map can't use more than 256 tile types")
+        self.width = width
+        self.height = height
+        self.palette = palette
+        # a memoryview (from `open`) is kept as is so the tiles stay in the mapped file
+        self.tiles = tiles if isinstance(tiles, memoryview) else bytes(tiles)
+        self.party_spawns = party_spawns
+        self.boss_spawn = boss_spawn
+
+    def tile_at(self, x: int, y: int) -> TileType:
+        return self.palette[self.tiles[y * self.width + x]]
+
+    def to_board(self) -> Board:
+        'build a new Board with fresh squares from this template'
+        palette = self.palette
+        tiles = self.tiles
+        width = self.width
+        grid = []
+        for y in range(self.height):
+            offset = y * width
+            grid.append([palette[tiles[offset + x]].to_square(Point(x, y)) for x in range(width)])
+        return Board(grid=grid)
+
+    def to_lazy_board(self) -> LazyBoard:
+        'a Board that creates squares from this template only as they are used'
+        return LazyBoard(self)
+
+    #####################
+    # ~~ Conversions ~~ #
+    #####################
+
+    @classmethod
+    def from_board(cls, board: Board) -> 'MapTemplate':
+        palette: dict[TileType, int] = {}
+        tiles = bytearray()
+        party_spawns = []
+        boss_spawn = None
+        for y, row in enumerate(board.grid):
+            for x, square in enumerate(row):
+                tile = TileType.from_square(square)
+                tiles.append(palette.setdefault(tile, len(palette)))
+                if tile.symbol == PARTY_SPAWN:
+                    party_spawns.append(Point(x, y))
+                elif tile.symbol == BOSS_SPAWN and boss_spawn is None:
+                    boss_spawn = Point(x, y)
+        return cls(board.width, board.height, tuple(palette), bytes(tiles), tuple(party_spawns), boss_spawn)
+
+    @classmethod
+    def from_json(cls, json_str: str) -> 'MapTemplate':
+        'parse the JSON map format (a list of rows of square dicts)'
+        squares = json.loads(json_str)
+        height = len(squares)
+        width = len(squares[0]) if squares else 0
+        palette: dict[TileType, int] = {}
+        tiles = bytearray(width * height)
+        party_spawns = []
+        boss_spawn = None
+        for row in squares:
+            for d in row:
+                x, y = d['position']
+                tile = TileType(d['symbol'], d['impassable'], d['is_burning'],
+                                d['is_lava'], d['is_water'], d['damage'])
+                tiles[y * width + x] = palette.setdefault(tile, len(palette))
+                if tile.symbol == PARTY_SPAWN:
+                    party_spawns.append(Point(x, y))
+                elif tile.symbol == BOSS_SPAWN and boss_spawn is None:
+                    boss_spawn = Point(x, y)
+        party_spawns.sort(key=lambda p: (p.y, p.x))
+        return cls(width, height, tuple(palette), bytes(tiles), tuple(party_spawns), boss_spawn)
+
+    def to_bytes(self) -> bytes:
+        out = bytearray(_HEADER.pack(MAGIC, VERSION, self.width, self.height, len(self.palette) % 256))
+        for tile in self.palette:
+            symbol = tile.symbol.encode('utf8')
+            flags = ((_IMPASSABLE if tile.impassable else 0) | (_BURNING if tile.is_burning else 0)
+                     | (_LAVA if tile.is_lava else 0) | (_WATER if tile.is_water else 0))
+            out += bytes((len(symbol),)) + symbol + _TILE.pack(flags, tile.damage)
+        out += bytes((len(self.party_spawns),))
+        for point in self.party_spawns:
+            out += _POINT.pack(point.x, point.y)
+        boss = self.boss_spawn
+        out += _POINT.pack(boss.x, boss.y) if boss is not None else _POINT.pack(_NO_SPAWN, _NO_SPAWN)
+        out += self.tiles
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'MapTemplate':
+        header, offset = cls._parse_header(data)
+        width, height = header[0], header[1]
+        return cls(width, height, header[2], bytes(data[offset:offset + width * height]), *header[3:])
+
+    @classmethod
+    def open(cls, path: str) -> 'MapTemplate':
+        '''
+        Memory-map a compiled map. Only the header is read up front; the tiles stay
+        in the file and the OS pages them in as they're read, so opening a huge map
+        costs about the same as opening a small one. Pair with `to_lazy_board()`.
+        '''
+        with open(path, 'rb') as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        header, offset = cls._parse_header(mapped)
+        width, height = header[0], header[1]
+        if len(mapped) < offset + width * height:
+            raise ValueError(f"{path}: truncated map, expected {width * height} tiles")
+        return cls(width, height, header[2], memoryview(mapped)[offset:offset + width * height], *header[3:])
+
+    @staticmethod
+    def _parse_header(data) -> tuple[tuple, int]:
+        'parse everything but the tiles; returns (width, height, palette, party_spawns, boss_spawn) and the offset of the tiles'
+        magic, version, width, height, palette_size = _HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a compiled pydungeoncrawl map")
+        if version != VERSION:
+            raise ValueError(f"Unsupported map format version {version}")
+        offset = _HEADER.size
+
+        palette = []
+        for _ in range(palette_size or 256):
+            length = data[offset]
+            symbol = bytes(data[offset + 1:offset + 1 + length]).decode('utf8')
+            offset += 1 + length
+            flags, damage = _TILE.unpack_from(data, offset)
+            offset += _TILE.size
+            palette.append(TileType(symbol, bool(flags & _IMPASSABLE), bool(flags & _BURNING),
+                                    bool(flags & _LAVA), bool(flags & _WATER), damage))
+
+        party_spawns = []
+        for _ in range(data[offset]):
+            party_spawns.append(Point(*_POINT.unpack_from(data, offset + 1 + _POINT.size * len(party_spawns))))
+        offset += 1 + _POINT.size * len(party_spawns)
+        x, y = _POINT.unpack_from(data, offset)
+        boss_spawn = None if x == _NO_SPAWN else Point(x, y)
+        offset += _POINT.size
+
+        return (width, height, tuple(palette), tuple(party_spawns), boss_spawn), offset
+
+    def save(self, path: str) -> None:
+        with open(path, 'wb') as file:
+            file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> 'MapTemplate':
+        with open(path, 'rb') as file:
+            return cls.from_bytes(file.read())
+
+    def __repr__(self) -> str:
+        return f"MapTemplate({self.width} * {self.height} grid, {len(self.palette)} tile types)"
+
+
+def _mtime(resource) -> Union[float, None]:
+    'the modification time of a bundled resource, or None when it isn\'t a file on disk (e.g. in a zip)'
+    try:
+        return resource.stat().st_mtime
+    except (AttributeError, OSError):
+        return None
+
+
+@lru_cache(maxsize=None)
+def get_template(map_name: str) -> MapTemplate:
+    """Returns the parsed template for a bundled map, parsing it only once per process.
+
+    A compiled `.pdcmap` next to the JSON map is used when it exists, unless the
+    JSON has been modified since the map was compiled; then the JSON is parsed
+    instead, so that an edit to the JSON is never hidden by a stale `.pdcmap`.
+
+    :param map_name: the name of the map, e.g. 'forest_path.json'
+    :return: the MapTemplate for the map
+    """
+    stem = map_name[:-len('.json')] if map_name.endswith('.json') else map_name
+    maps = resources.files(base_maps)
+    compiled = maps / (stem + EXTENSION)
+    if compiled.is_file():
+        compiled_time, json_time = _mtime(compiled), _mtime(maps / map_name)
+        if compiled_time is None or json_time is None or json_time <= compiled_time:
+            return MapTemplate.from_bytes(compiled.read_bytes())
+    return MapTemplate.from_json(resources.read_text(base_maps, map_name))
@@ -1,5 +1,4 @@
 import json
-import copy
 from typing import Any, Dict, List
 
 try:
@@ -12,6 +11,7 @@ from . import base_maps
 
 from ..entities.board import Square, Board
 from .location import Point
+from .map_format import get_template
 
 
 _TILE_MAP = {
@@ -64,20 +64,12 @@ def json_to_board(json_str: str) -> Board:
 
 
 def tiff_to_dict(read_loc: str, save: bool=False, save_loc: str='') -> List[Dict]:
-    from PIL import Image
-
-    im = Image.open(read_loc, 'r')
-    width, height = im.size
-    picture = im.load()
-    js = []
-    for y in range(height):
-        row = []
-        for x in range(width):
-            square = copy.deepcopy(_TILE_MAP[picture[x,y]]) # type: ignore
-            square.update({'position':(x,(height-y)-1)})
-            row.append(square)
-
-        js.append(row)
+    from .map_compiler import image_to_template
+
+    template = image_to_template(read_loc)
+    js = [[{**template.tile_at(x, y)._asdict(), 'position': (x, y)}
+           for x in range(template.width)]
+          for y in range(template.height - 1, -1, -1)]
     
     if save and save_loc:
         with open(save_loc, 'w', encoding='utf8') as file:
@@ -92,4 +84,4 @@ def get_map(map_name: str) -> Board:
     :param map_name: the name of the map to load
     :return: a Board object for the given map
     """
-    return json_to_board(resources.read_text(base_maps, map_name))
\ No newline at end of file
+    return get_template(map_name).to_board()
\ No newline at end of file
@@ -0,0 +1,128 @@
+"""
+Fixed-size NumPy observations of a level, kept up to date incrementally:
+
+    encoder = ObservationEncoder(level)
+    for turn in level:
+        obs = encoder.update()
+        obs.board       # (len(BOARD_LAYERS), height, width), indexed [layer, y, x]
+        obs.pawns       # (pawns, len(PAWN_FEATURES)), the party then the boss
+        obs.effects     # (pawns, len(encoder.effect_names) + 1) stack counts
+        obs.cooldowns   # (pawns, encoder.ability_slots) turns left
+
+The board is encoded in full once (straight from the map template for a
+LazyBoard). After that the encoder watches the board's squares (`Board._watch()`)
+and only rewrites the cells of squares that changed since the last `update()`:
+terrain toggles, hazards and occupants. A pawn's effect counts are only
+recounted when its effects were added to or removed from (`Effects._version`).
+Positions, health and facing are a handful of numbers per pawn and are
+rewritten every update, and so are cooldowns, which tick down every turn.
+
+The arrays are updated in place; copy them to keep an observation.
+
+`effects` has one column per name in `effect_names` (`_SORT_PRIORITY`'s names,
+then any `extra_effects`), plus a last column for every other effect. The
+columns of `cooldowns` follow each pawn's `abilities()`; pawns with fewer
+abilities than `ability_slots` have zeros in the rest.
+
+NumPy is required: `pip install pydungeoncrawl[training]`.
+"""
+from typing import Any, NamedTuple, Sequence
+
+try:
+    import numpy as np
+except ModuleNotFoundError:
+    np = None
+
+from ..entities.board import LazyBoard, Square
+from ..entities.effects import _SORT_PRIORITY
+
+
+BOARD_LAYERS = ('wall', 'water', 'burning', 'lava', 'party', 'boss')
+PAWN_FEATURES = ('x', 'y', 'health', 'facing_x', 'facing_y', 'alive')
+
+_WALL, _WATER, _BURNING, _LAVA, _PARTY, _BOSS = range(len(BOARD_LAYERS))
+
+
+class Observation(NamedTuple):
+    board: 'np.ndarray'
+    pawns: 'np.ndarray'
+    effects: 'np.ndarray'
+    cooldowns: 'np.ndarray'
+
+
+class ObservationEncoder:
+    def __init__(self, level, extra_effects: Sequence[str] = ()) -> None:
+        if np is None:
+            raise ModuleNotFoundError("ObservationEncoder needs NumPy: pip install pydungeoncrawl[training]")
+        self.level = level
+        self.effect_names = tuple(_SORT_PRIORITY) + tuple(name for name in extra_effects if name not in _SORT_PRIORITY)
+        self._effect_columns = {name: i for i, name in enumerate(self.effect_names)}
+        self._pawns = (*level.party.members, level.boss)
+        self._party_ids = {id(member) for member in level.party.members}
+        self._abilities = [[ability.name for ability in type(pawn).abilities()] for pawn in self._pawns]
+        self.ability_slots = max(len(names) for names in self._abilities)
+
+        board = level.board
+        self.observation = Observation(
+            np.zeros((len(BOARD_LAYERS), board.height, board.width), dtype=np.float32),
+            np.zeros((len(self._pawns), len(PAWN_FEATURES)), dtype=np.float32),
+            np.zeros((len(self._pawns), len(self.effect_names) + 1), dtype=np.float32),
+            np.zeros((len(self._pawns), self.ability_slots), dtype=np.float32))
+        self._effect_versions = [0] * len(self._pawns)
+        self._encode_board()
+        self._changed = board._watch()
+
+    def close(self) -> None:
+        'stop watching the board'
+        self.level.board._unwatch(self._changed)
+
+    def _encode_board(self) -> None:
+        board, layers = self.level.board, self.observation.board
+        if isinstance(board, LazyBoard):
+            # the whole template in one lookup, then the squares created so far on top
+            template = board._template
+            flags = np.array([(tile.impassable, tile.is_water, tile.is_burning, tile.is_lava)
+                              for tile in template.palette], dtype=np.float32)
+            tiles = np.frombuffer(template.tiles, dtype=np.uint8)  # type: ignore[call-overload]
+            layers[_WALL:_LAVA + 1] = flags[tiles].reshape(board.height, board.width, 4).transpose(2, 0, 1)
+            squares = board._live_squares()
+        else:
+            squares = (square for row in board.grid for square in row)
+        for square in squares:
+            self._encode_square(square)
+
+    def _encode_square(self, square: Square) -> None:
+        x, y = square.position.x, square.position.y
+        cell = self.observation.board[:, y, x]
+        occupant = square.occupant
+        cell[:] = (square._impassable, square.is_water, square.is_burning, square.is_lava,
+                   occupant is not None and id(occupant) in self._party_ids,
+                   occupant is not None and occupant is self.level.boss)
+
+    def update(self) -> Observation:
+        'bring the observation up to date with the level, and return it'
+        changed = self._changed
+        if changed:
+            for square in changed:
+                self._encode_square(square)
+            changed.clear()
+
+        board = self.level.board
+        width, height = board.width, board.height
+        pawns, effects, cooldowns = self.observation.pawns, self.observation.effects, self.observation.cooldowns
+        columns, other = self._effect_columns, len(self.effect_names)
+        for i, pawn in enumerate(self._pawns):
+            position, facing = pawn.position, pawn.facing_direction
+            pawns[i] = (position.x / width, position.y / height, pawn.health / pawn.health_max,
+                        facing.x, facing.y, pawn.is_alive)
+
+            if pawn.effects._version != self._effect_versions[i]:
+                self._effect_versions[i] = pawn.effects._version
+                row = effects[i]
+                row[:] = 0
+                for effect in pawn.effects._effects:
+                    row[columns.get(effect.name, other)] += 1
+
+            remaining = pawn._ability_cooldowns
+            cooldowns[i, :len(self._abilities[i])] = [remaining.get(name, 0) for name in self._abilities[i]]
+        return self.observation
@@ -0,0 +1,117 @@
+import json
+from time import perf_counter_ns
+from typing import Any, Union
+
+
+def _timing(calls: int, total_ns: int) -> dict[str, Union[int, float]]:
+    return {
+        'calls': calls,
+        'total_ns': total_ns,
+        'mean_ns': total_ns / calls if calls else 0.0,
+    }
+
+
+class Profile:
+    '''
+    Per-phase timers for a `Level`, available as `level.profile`.
+
+    The profile is off by default and costs a couple of attribute lookups per
+    turn while it's off. Turn it on before iterating the level:
+
+    `level.profile.enable()`
+
+    `phases` holds `[calls, total_ns]` for each part of the turn loop, and
+    `abilities` holds `[calls, total_ns]` for each ability, keyed by the name
+    of the class that used it and then the ability name.
+
+    `to_dict()` and `to_json()` export the collected timings.
+    '''
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.turns = 0
+        self.phases: dict[str, list[int]] = {}
+        self.abilities: dict[str, dict[str, list[int]]] = {}
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        self.turns = 0
+        self.phases = {}
+        self.abilities = {}
+
+    ###################
+    # ~~ Recording ~~ #
+    ###################
+
+    def clock(self) -> int:
+        'current time in nanoseconds, or 0 when profiling is off'
+        return perf_counter_ns() if self.enabled else 0
+
+    def lap(self, phase: str, start: int) -> int:
+        '''
+        Record the time since `start` against `phase` and return the current time.
+        A `start` of 0 comes from before profiling was turned on, so nothing is
+        recorded for that phase; the laps after it are timed from now.
+        '''
+        if not self.enabled:
+            return 0
+        now = perf_counter_ns()
+        if not start:
+            return now
+        timing = self.phases.get(phase)
+        if timing is None:
+            timing = self.phases[phase] = [0, 0]
+        timing[0] += 1
+        timing[1] += now - start
+        return now
+
+    def record_ability(self, owner: str, ability: str, elapsed_ns: int) -> None:
+        'record one use of an ability by a pawn of class `owner`'
+        by_owner = self.abilities.setdefault(owner, {})
+        timing = by_owner.get(ability)
+        if timing is None:
+            timing = by_owner[ability] = [0, 0]
+        timing[0] += 1
+        timing[1] += elapsed_ns
+
+    ################
+    # ~~ Export ~~ #
+    ################
+
+    @property
+    def total_ns(self) -> int:
+        return sum(total for _, total in self.phases.values())
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            'turns': self.turns,
+            'total_ns': self.total_ns,
+            'phases': {phase: _timing(*timing) for phase, timing in self.phases.items()},
+            'abilities': {owner: {ability: _timing(*timing) for ability, timing in abilities.items()}
+                          for owner, abilities in self.abilities.items()},
+        }
+
+    def to_json(self, path: str = '', indent: Union[int, None] = 2) -> str:
+        'return the profile as a JSON string, and write it to `path` if one is given'
+        js = json.dumps(self.to_dict(), indent=indent)
+        if path:
+            with open(path, 'w', encoding='utf8') as file:
+                file.write(js)
+        return js
+
+    def __repr__(self) -> str:
+        return f"Profile({'on' if self.enabled else 'off'}, {self.turns} turns, {self.total_ns / 1e6:.2f} ms)"
+
+    def __str__(self) -> str:
+        lines = [repr(self)]
+        for phase, (calls, total) in sorted(self.phases.items(), key=lambda p: -p[1][1]):
+            lines.append(f"  {phase:<20} {calls:>8} calls {total / 1e6:>10.3f} ms")
+        for owner, abilities in self.abilities.items():
+            for ability, (calls, total) in sorted(abilities.items(), key=lambda a: -a[1][1]):
+                lines.append(f"  {owner + '.' + ability:<40} {calls:>8} calls {total / 1e6:>10.3f} ms")
+        return "\n".join(lines)
@@ -0,0 +1,372 @@
+"""
+Record fights as a compact stream of per-turn deltas, and play them back.
+
+Attach a recorder before iterating a level, then save it:
+
+    level.recorder = Recorder()
+    for turn in level:
+        ...
+    level.recorder.save('fight.pdcrec')
+
+    replay = Replay.load('fight.pdcrec')
+    replay.play()                   # watch it with the default renderer
+    replay.state_at(120)            # or jump to a turn
+
+The stream (all integers little-endian) is a header, `4s` magic b'PDCR', u8
+version, u16 width, u16 height, u16 keyframe interval, then tagged records:
+
+    STRING    u16 length, utf-8                      defines the next string id
+    PAWN      u16 name id, u16 symbol id             defines the next pawn index
+    EFFECT    u16 name id, u16 symbol id             defines the next effect id
+    BASE      u32 runs, (u32 length, u16 symbol id) per run: the starting terrain
+    KEYFRAME  a turn holding every tile that differs from BASE and every pawn
+    DELTA     a turn holding only the tiles and pawns that changed since the last
+
+A turn is u32 turn, u32 tile count, (u32 cell index, u16 symbol id) per tile,
+u8 pawn count, and per pawn u8 index, i16 x, i16 y, i16 facing x, i16 facing y,
+i32 health, i32 max health, u8 effect count, (u16 effect id, u8 stacks) per
+effect. Definitions always come before they're used. `save` compresses the
+stream with zlib.
+"""
+import bisect
+import struct
+import zlib
+from typing import NamedTuple
+
+from .rendering import Frame, RenderScheduler, default_renderer
+
+
+MAGIC = b'PDCR'
+VERSION = 1
+EXTENSION = '.pdcrec'
+
+_HEADER = struct.Struct('<4sBHHH')
+_U16 = struct.Struct('<H')
+_U32 = struct.Struct('<I')
+_DEFINITION = struct.Struct('<HH')
+_RUN = struct.Struct('<IH')
+_TILE = struct.Struct('<IH')
+_TURN = struct.Struct('<II')
+_PAWN = struct.Struct('<BhhhhiiB')
+_EFFECT = struct.Struct('<HB')
+
+_STRING, _PAWN_DEF, _EFFECT_DEF, _BASE, _KEYFRAME, _DELTA = range(1, 7)
+
+
+class PawnState(NamedTuple):
+    name: str
+    symbol: str
+    x: int
+    y: int
+    facing_x: int
+    facing_y: int
+    health: int
+    health_max: int
+    effects: tuple[tuple[str, int], ...]  # (symbol, stacks)
+
+    @property
+    def is_alive(self) -> bool:
+        return self.health > 0
+
+
+class TurnState(NamedTuple):
+    turn: int
+    width: int
+    height: int
+    terrain: list[str]  # row by row starting at y = 0
+    pawns: tuple[PawnState, ...]
+
+    def to_frame(self) -> Frame:
+        'a Frame that any renderer can draw'
+        status = [f"~~~~~~ TURN {self.turn:<4}~~~~~~"]
+        for pawn in self.pawns:
+            effects = " ".join(f"{symbol}{stacks:<2}" for symbol, stacks in pawn.effects)
+            status.append(f"| {pawn.symbol if pawn.is_alive else '💀'}:{pawn.name:<20} | "
+                          f"{pawn.health:>6}/{pawn.health_max:<6} | {effects}")
+        cells = list(self.terrain)
+        for pawn in self.pawns:
+            if 0 <= pawn.x < self.width and 0 <= pawn.y < self.height:
+                cells[pawn.y * self.width + pawn.x] = pawn.symbol if pawn.is_alive else '💀'
+        width = self.width
+        rows = tuple(tuple(cells[y * width:(y + 1) * width]) for y in range(self.height - 1, -1, -1))
+        return Frame(tuple(status), rows)
+
+
+class Recorder:
+    '''
+    Records a level turn by turn; set it as `level.recorder` before iterating.
+
+    Each turn only the tiles whose terrain changed and the pawns whose position,
+    facing, health or effects changed are written. Every `keyframe_interval`
+    turns a keyframe holds the whole state (relative to the starting terrain),
+    so a `Replay` can jump to any turn by decoding at most that many turns.
+
+    Between keyframes only the squares the board reports as changed
+    (`Board._watch()`) are looked at; `close()` stops watching the board, and
+    the level calls it when the fight ends.
+    '''
+
+    def __init__(self, keyframe_interval: int = 50) -> None:
+        if keyframe_interval < 1:
+            raise ValueError("keyframe_interval must be at least 1")
+        self.keyframe_interval = keyframe_interval
+        self.turns = 0
+        self._out = bytearray()
+        self._strings: dict[str, int] = {}
+        self._pawns: dict[int, int] = {}
+        self._effects: dict[tuple[str, str], int] = {}
+        self._width = 0
+        self._base: list[str] = []
+        self._terrain: list[str] = []
+        self._last: dict[int, tuple] = {}
+        self._since_keyframe = 0
+        self._board = None
+        self._changed: set = set()
+
+    def _string(self, text: str) -> int:
+        string_id = self._strings.get(text)
+        if string_id is None:
+            string_id = self._strings[text] = len(self._strings)
+            encoded = text.encode('utf8')
+            self._out += bytes((_STRING,)) + _U16.pack(len(encoded)) + encoded
+        return string_id
+
+    def _pawn(self, pawn) -> int:
+        index = self._pawns.get(id(pawn))
+        if index is None:
+            name, symbol = self._string(pawn.name), self._string(pawn._symbol)
+            index = self._pawns[id(pawn)] = len(self._pawns)
+            self._out += bytes((_PAWN_DEF,)) + _DEFINITION.pack(name, symbol)
+        return index
+
+    def _effect(self, effect) -> int:
+        key = (effect.name, effect.symbol)
+        effect_id = self._effects.get(key)
+        if effect_id is None:
+            name, symbol = self._string(effect.name), self._string(effect.symbol)
+            effect_id = self._effects[key] = len(self._effects)
+            self._out += bytes((_EFFECT_DEF,)) + _DEFINITION.pack(name, symbol)
+        return effect_id
+
+    def _start(self, board) -> None:
+        self._width = board.width
+        self._out += _HEADER.pack(MAGIC, VERSION, board.width, board.height, self.keyframe_interval)
+        self._base = board._terrain_symbols()
+        self._terrain = list(self._base)
+        runs = []
+        for index, symbol in enumerate(self._base):
+            if runs and runs[-1][1] == symbol:
+                runs[-1][0] += 1
+            else:
+                runs.append([1, symbol])
+        body = b''.join(_RUN.pack(length, self._string(symbol)) for length, symbol in runs)
+        self._out += bytes((_BASE,)) + _U32.pack(len(runs)) + body
+
+    def close(self) -> None:
+        'stop watching the board; recording another turn starts watching it again'
+        if self._board is not None:
+            self._board._unwatch(self._changed)
+            self._board = None
+
+    def record(self, level) -> None:
+        'record the state of `level` at the end of its current turn'
+        board = level.board
+        if not self._out:
+            self._start(board)
+        keyframe = self._since_keyframe == 0
+        if board is not self._board:
+            # the first turn, or the first since `close()`: the watcher missed what came before
+            self.close()
+            self._board, self._changed = board, board._watch()
+            keyframe = True
+            self._since_keyframe = 0
+
+        width, terrain = self._width, self._terrain
+        changed = []
+        squares = board._live_squares() if keyframe else self._changed
+        for square in squares:
+            index = square.position.y * width + square.position.x
+            symbol = square._temp_symbol or square._symbol
+            if terrain[index] != symbol:
+                terrain[index] = symbol
+                changed.append(index)
+        self._changed.clear()
+        changed.sort()
+
+        pawns = []
+        for pawn in (*level.party, level.boss):
+            stacks: dict[int, int] = {}
+            for effect in pawn.effects._effects:
+                effect_id = self._effect(effect)
+                stacks[effect_id] = stacks.get(effect_id, 0) + 1
+            facing = pawn.facing_direction
+            pawns.append((self._pawn(pawn), (pawn.position.x, pawn.position.y, facing.x, facing.y,
+                                             pawn.health, pawn.health_max, tuple(sorted(stacks.items())))))
+
+        if keyframe:
+            base = self._base
+            changed = [index for index, symbol in enumerate(terrain) if symbol != base[index]]
+        else:
+            pawns = [(index, state) for index, state in pawns if self._last.get(index) != state]
+        self._since_keyframe = (self._since_keyframe + 1) % self.keyframe_interval
+
+        # define any new symbols before the turn starts
+        tiles = [_TILE.pack(index, self._string(terrain[index])) for index in changed]
+        out = self._out
+        out += bytes((_KEYFRAME if keyframe else _DELTA,)) + _TURN.pack(level.turn_count, len(changed))
+        out += b''.join(tiles)
+        out += bytes((len(pawns),))
+        for index, state in pawns:
+            self._last[index] = state
+            x, y, fx, fy, health, health_max, effects = state
+            out += _PAWN.pack(index, x, y, fx, fy, health, health_max, len(effects))
+            for effect_id, count in effects:
+                out += _EFFECT.pack(effect_id, min(count, 255))
+        self.turns += 1
+
+    def getvalue(self) -> bytes:
+        'the uncompressed stream'
+        return bytes(self._out)
+
+    def save(self, path: str) -> None:
+        with open(path, 'wb') as file:
+            file.write(zlib.compress(self._out, 9))
+
+
+class Replay:
+    '''
+    A recorded fight. `state_at(turn)` decodes from the nearest keyframe at or
+    before `turn`; `frames()` walks every recorded turn in order; `play()`
+    draws them with a renderer.
+    '''
+
+    def __init__(self, data: bytes) -> None:
+        if not data.startswith(MAGIC):
+            data = zlib.decompress(data)
+        magic, version, self.width, self.height, self.keyframe_interval = _HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a pydungeoncrawl recording")
+        if version != VERSION:
+            raise ValueError(f"Unsupported recording version {version}")
+        self._data = data
+        self._strings: list[str] = []
+        self._pawns: list[tuple[str, str]] = []
+        self._effects: list[tuple[str, str]] = []
+        self._base: list[str] = []
+        # (turn, offset, is keyframe) of every recorded turn, in order
+        self._turns: list[tuple[int, int, bool]] = []
+        self._index()
+
+    @classmethod
+    def load(cls, path: str) -> 'Replay':
+        with open(path, 'rb') as file:
+            return cls(file.read())
+
+    @property
+    def turns(self) -> list[int]:
+        return [turn for turn, _, _ in self._turns]
+
+    def _index(self) -> None:
+        'read every definition and note where each turn starts'
+        data = self._data
+        offset = _HEADER.size
+        while offset < len(data):
+            tag = data[offset]
+            offset += 1
+            if tag == _STRING:
+                (length,) = _U16.unpack_from(data, offset)
+                self._strings.append(data[offset + 2:offset + 2 + length].decode('utf8'))
+                offset += 2 + length
+            elif tag in (_PAWN_DEF, _EFFECT_DEF):
+                name, symbol = _DEFINITION.unpack_from(data, offset)
+                (self._pawns if tag == _PAWN_DEF else self._effects).append((self._strings[name], self._strings[symbol]))
+                offset += _DEFINITION.size
+            elif tag == _BASE:
+                (runs,) = _U32.unpack_from(data, offset)
+                offset += _U32.size
+                for length, symbol in _RUN.iter_unpack(data[offset:offset + runs * _RUN.size]):
+                    self._base += [self._strings[symbol]] * length
+                offset += runs * _RUN.size
+            elif tag in (_KEYFRAME, _DELTA):
+                turn, _ = _TURN.unpack_from(data, offset)
+                self._turns.append((turn, offset, tag == _KEYFRAME))
+                offset = self._skip_turn(offset)
+            else:
+                raise ValueError(f"Corrupt recording: unknown record {tag} at byte {offset - 1}")
+
+    def _skip_turn(self, offset: int) -> int:
+        data = self._data
+        _, tiles = _TURN.unpack_from(data, offset)
+        offset += _TURN.size + tiles * _TILE.size
+        pawns = data[offset]
+        offset += 1
+        for _ in range(pawns):
+            effects = _PAWN.unpack_from(data, offset)[-1]
+            offset += _PAWN.size + effects * _EFFECT.size
+        return offset
+
+    def _apply(self, offset: int, terrain: dict[int, str], pawns: dict[int, PawnState]) -> None:
+        data, strings = self._data, self._strings
+        _, tiles = _TURN.unpack_from(data, offset)
+        offset += _TURN.size
+        for index, symbol in _TILE.iter_unpack(data[offset:offset + tiles * _TILE.size]):
+            terrain[index] = strings[symbol]
+        offset += tiles * _TILE.size
+        count = data[offset]
+        offset += 1
+        for _ in range(count):
+            index, x, y, fx, fy, health, health_max, effect_count = _PAWN.unpack_from(data, offset)
+            offset += _PAWN.size
+            effects = tuple((self._effects[effect_id][1], stacks)
+                            for effect_id, stacks in _EFFECT.iter_unpack(data[offset:offset + effect_count * _EFFECT.size]))
+            offset += effect_count * _EFFECT.size
+            name, symbol = self._pawns[index]
+            pawns[index] = PawnState(name, symbol, x, y, fx, fy, health, health_max, effects)
+
+    def _state(self, position: int, terrain: dict[int, str], pawns: dict[int, PawnState]) -> TurnState:
+        full = list(self._base)
+        for index, symbol in terrain.items():
+            full[index] = symbol
+        turn = self._turns[position][0]
+        return TurnState(turn, self.width, self.height, full, tuple(pawns[i] for i in sorted(pawns)))
+
+    def state_at(self, turn: int) -> TurnState:
+        'the state at the end of the last recorded turn at or before `turn`'
+        position = bisect.bisect_right(self._turns, turn, key=lambda t: t[0]) - 1
+        if position < 0:
+            raise ValueError(f"Turn {turn} is before the start of the recording")
+        start = position
+        while not self._turns[start][2]:
+            start -= 1
+        terrain: dict[int, str] = {}
+        pawns: dict[int, PawnState] = {}
+        for _, offset, _ in self._turns[start:position + 1]:
+            self._apply(offset, terrain, pawns)
+        return self._state(position, terrain, pawns)
+
+    def frames(self):
+        'every recorded turn as a TurnState, in order'
+        terrain: dict[int, str] = {}
+        pawns: dict[int, PawnState] = {}
+        for position, (_, offset, keyframe) in enumerate(self._turns):
+            if keyframe:
+                terrain = {}
+            self._apply(offset, terrain, pawns)
+            yield self._state(position, terrain, pawns)
+
+    def play(self, renderer=None, tick_speed: float = 0.25, start: int = 0) -> None:
+        'draw the recording from turn `start`, one turn every `tick_speed` seconds'
+        renderer = renderer or default_renderer()
+        scheduler = RenderScheduler()
+        for state in self.frames():
+            if state.turn < start:
+                continue
+            renderer.draw_frame(state.to_frame())
+            scheduler.wait(tick_speed)
+        renderer.flush()
+
+    def __len__(self) -> int:
+        return len(self._turns)
+
+    def __repr__(self) -> str:
+        return f"Replay({self.width} * {self.height} grid, {len(self._turns)} turns, {len(self._data)} bytes)"
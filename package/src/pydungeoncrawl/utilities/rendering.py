@@ -0,0 +1,294 @@
+"""
+Renderers that draw a `Level` each turn, available as `level.renderer`, and the
+`RenderScheduler` (`level.scheduler`) that decides when they draw.
+
+A renderer has `draw_frame(frame)`, `draw(level)`, `flush()` and `reset()`; a
+`Frame` is an immutable snapshot of what's on screen, so it can be drawn on
+another thread while the level carries on. `default_renderer()` picks a
+renderer for where the game is running: `JupyterRenderer` in a Jupyter kernel,
+and `TerminalRenderer` everywhere else.
+"""
+import asyncio
+import html
+import sys
+import threading
+import time
+from typing import NamedTuple, TextIO, Union
+
+
+CLEAR_SCREEN = '\x1b[H\x1b[2J'
+CLEAR_LINE = '\x1b[K'
+
+
+class Frame(NamedTuple):
+    'the status lines and board symbols (top row first) of a level at one moment'
+    status: tuple[str, ...]
+    rows: tuple[tuple[str, ...], ...]
+
+    @classmethod
+    def capture(cls, level) -> 'Frame':
+        return cls(tuple(level._marquis.split('\n')), tuple(map(tuple, level.board._symbol_rows())))
+
+    def __str__(self) -> str:
+        'the same text as `str(level)`'
+        return "".join(["\n".join(self.status), "\n", *("".join(row) + "\n" for row in self.rows)])
+
+
+def _move(row: int, column: int) -> str:
+    'ANSI cursor move; rows and columns start at 1'
+    return f'\x1b[{row};{column}H'
+
+
+class TerminalRenderer:
+    '''
+    Draws a level in a terminal with ANSI escape codes, sending only what
+    changed since the previous frame.
+
+    The first frame (and any frame after `reset()`, or whose layout changed)
+    clears the screen and writes everything. After that, each changed status
+    line is rewritten in place, and each run of changed board squares gets one
+    cursor move followed by the new symbols. Every board symbol is assumed to be
+    `cell_width` columns wide (emoji are 2).
+
+    `bytes_written` counts the UTF-8 bytes sent so far.
+    '''
+
+    def __init__(self, stream: Union[TextIO, None] = None, cell_width: int = 2) -> None:
+        self.stream = stream
+        self.cell_width = cell_width
+        self.bytes_written = 0
+        self._status: tuple[str, ...] = ()
+        self._rows: tuple[tuple[str, ...], ...] = ()
+
+    def reset(self) -> None:
+        'forget the last frame, so the next one is drawn in full'
+        self._status = ()
+        self._rows = ()
+
+    def render(self, frame: Frame) -> str:
+        'the text that turns the last frame drawn into `frame`'
+        status, rows = frame
+        previous_status, previous_rows = self._status, self._rows
+        self._status, self._rows = status, rows
+
+        if (len(status) != len(previous_status) or len(rows) != len(previous_rows)
+                or (rows and len(rows[0]) != len(previous_rows[0]))):
+            return CLEAR_SCREEN + str(frame)
+
+        parts = []
+        for i, (line, old) in enumerate(zip(status, previous_status)):
+            if line != old:
+                parts.append(_move(i + 1, 1) + line + CLEAR_LINE)
+
+        top = len(status) + 1
+        cell_width = self.cell_width
+        for r, (row, old) in enumerate(zip(rows, previous_rows)):
+            if row == old:
+                continue
+            x, width = 0, len(row)
+            while x < width:
+                if row[x] == old[x]:
+                    x += 1
+                    continue
+                start = x
+                while x < width and row[x] != old[x]:
+                    x += 1
+                parts.append(_move(top + r, start * cell_width + 1) + "".join(row[start:x]))
+
+        if parts:
+            # leave the cursor under the board, where a full frame leaves it
+            parts.append(_move(top + len(rows), 1))
+        return "".join(parts)
+
+    def draw(self, level) -> None:
+        self.draw_frame(Frame.capture(level))
+
+    def flush(self) -> None:
+        pass
+
+    def draw_frame(self, frame: Frame) -> None:
+        out = self.render(frame)
+        if out:
+            stream = self.stream or sys.stdout
+            stream.write(out)
+            stream.flush()
+            self.bytes_written += len(out.encode('utf8'))
+
+
+class JupyterRenderer:
+    '''
+    Draws a level in a notebook by updating one output, instead of clearing the
+    cell and printing a new one every turn.
+
+    The first frame creates a display with `display(..., display_id=True)`; every
+    frame after that calls `update()` on it with the board and marquee as a single
+    `<pre>` block. Updates are throttled to `max_fps` a second (0 means no limit);
+    a throttled frame is kept and drawn by `flush()`, which the scheduler calls at
+    the end of a fight.
+    '''
+
+    def __init__(self, max_fps: float = 10) -> None:
+        self.max_fps = max_fps
+        self.updates = 0
+        self._handle = None
+        self._last_update = 0.0
+        self._pending: Union[Frame, None] = None
+
+    def reset(self) -> None:
+        'start a new output on the next frame'
+        self._handle = None
+        self._pending = None
+
+    @staticmethod
+    def to_html(frame: Frame) -> str:
+        return ('<pre style="line-height: 1.2; font-family: monospace; margin: 0">'
+                + html.escape(str(frame)) + '</pre>')
+
+    def draw(self, level) -> None:
+        self.draw_frame(Frame.capture(level))
+
+    def draw_frame(self, frame: Frame) -> None:
+        now = time.perf_counter()
+        if self._handle is not None and self.max_fps and now - self._last_update < 1 / self.max_fps:
+            self._pending = frame
+            return
+        self._show(frame)
+        self._last_update = now
+
+    def flush(self) -> None:
+        'draw the last throttled frame, if there is one'
+        if self._pending is not None:
+            self._show(self._pending)
+            self._last_update = time.perf_counter()
+
+    def _show(self, frame: Frame) -> None:
+        from IPython.display import HTML, display
+        self._pending = None
+        content = HTML(self.to_html(frame))
+        if self._handle is None:
+            self._handle = display(content, display_id=True)
+        else:
+            self._handle.update(content)
+        self.updates += 1
+
+
+def _in_notebook() -> bool:
+    try:
+        from IPython import get_ipython
+    except ModuleNotFoundError:
+        return False
+    shell = get_ipython()
+    if shell is None:
+        return False
+    if 'google.colab' in sys.modules:
+        return True
+    try:
+        # Colab's and other kernels' shells are subclasses with names of their own
+        from ipykernel.zmqshell import ZMQInteractiveShell
+    except ModuleNotFoundError:
+        return shell.__class__.__name__ == 'ZMQInteractiveShell'
+    return isinstance(shell, ZMQInteractiveShell)
+
+
+def default_renderer() -> Union[TerminalRenderer, JupyterRenderer]:
+    return JupyterRenderer() if _in_notebook() else TerminalRenderer()
+
+
+class RenderScheduler:
+    '''
+    Paces a level's turns and decides which of them get drawn.
+
+    `every`: only draw every `every`-th turn.
+    `fps`: never draw more than `fps` frames a second (0 means no limit).
+    `background`: draw on a worker thread. The level only captures a `Frame` and
+    carries on; if frames arrive faster than they can be drawn, the worker skips
+    to the newest one.
+
+    `wait(tick_speed)` (or `await wait_async(tick_speed)`) sleeps for what's left
+    of `tick_speed` since the previous turn ended, so the time spent simulating (and in the player's code) is
+    taken out of the sleep instead of added to it. The last frame of a fight is
+    always drawn, by `finish`.
+    '''
+
+    def __init__(self, every: int = 1, fps: float = 0, background: bool = False) -> None:
+        if every < 1:
+            raise ValueError("every must be at least 1")
+        if fps < 0:
+            raise ValueError("fps can't be negative")
+        self.every = every
+        self.fps = fps
+        self.background = background
+        self.frames_drawn = 0
+        self._last_draw = 0.0
+        self._turn_end: Union[float, None] = None
+        self._pending: Union[tuple, None] = None
+        self._drawing = False
+        self._condition = threading.Condition()
+        self._worker: Union[threading.Thread, None] = None
+
+    def render(self, level) -> bool:
+        'draw the level if this turn is due a frame; returns True if it was drawn (or queued)'
+        if level.turn_count % self.every:
+            return False
+        now = time.perf_counter()
+        if self.fps and now - self._last_draw < 1 / self.fps:
+            return False
+        self._last_draw = now
+        self._submit(level.renderer, Frame.capture(level))
+        return True
+
+    def _delay(self, tick_speed: float) -> float:
+        'what is left of `tick_speed` since the previous turn ended'
+        if self._turn_end is None:
+            return tick_speed
+        return tick_speed - (time.perf_counter() - self._turn_end)
+
+    def wait(self, tick_speed: float) -> None:
+        'sleep for the rest of the turn'
+        delay = self._delay(tick_speed)
+        if delay > 0:
+            time.sleep(delay)
+        self._turn_end = time.perf_counter()
+
+    async def wait_async(self, tick_speed: float) -> None:
+        'like `wait`, but lets the event loop run in the meantime'
+        delay = self._delay(tick_speed)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._turn_end = time.perf_counter()
+
+    def finish(self, level) -> None:
+        'draw the final frame and wait until everything queued has been drawn'
+        self._submit(level.renderer, Frame.capture(level))
+        if self._worker is not None:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending is None and not self._drawing)
+        level.renderer.flush()
+        self._turn_end = None
+
+    def _submit(self, renderer, frame: Frame) -> None:
+        if not self.background:
+            renderer.draw_frame(frame)
+            self.frames_drawn += 1
+            return
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._draw_forever, name='pydungeoncrawl-render', daemon=True)
+            self._worker.start()
+        with self._condition:
+            self._pending = (renderer, frame)
+            self._condition.notify_all()
+
+    def _draw_forever(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending is not None)
+                renderer, frame = self._pending  # type: ignore[misc]
+                self._pending = None
+                self._drawing = True
+            try:
+                renderer.draw_frame(frame)
+                self.frames_drawn += 1
+            finally:
+                with self._condition:
+                    self._drawing = False
+                    self._condition.notify_all()
@@ -0,0 +1,284 @@
+"""
+Deterministic replays: a seed plus the calls each hero made every turn.
+
+Record a game by letting an `InputRecorder` create the level:
+
+    recorder = InputRecorder(seed=42)
+    level = recorder.new_level(ForestPath, party, boss, show_board=False)
+    for turn in level:
+        ...                         # the party's code, as usual
+    recorder.save('fight.replay.json.gz')
+
+`run_replay('fight.replay.json.gz')` builds the same level, party and boss, and
+re-drives it with the recorded calls without running any party code. Every
+`checksum_every` turns the state of the game is compared with the recording,
+and `ReplayDiverged` is raised at the first turn that doesn't match.
+
+The RNG is reseeded from the seed at the start of every player turn and every
+engine turn, so the engine's dice don't depend on how much randomness the
+party's code used. Randomness the party's code draws *between* two of its own
+ability calls in the same turn does still shift what those abilities roll; the
+checksums catch that.
+
+Arguments are recorded as plain values, points, squares, pawns (by index) and
+the party. A call with any other argument is logged as unrecordable rather than
+breaking the party's turn; the replay skips it, and the checksums report where
+the game stops matching.
+"""
+import base64
+import gzip
+import importlib
+import json
+import random
+import zlib
+from typing import Any, Union
+
+from ..entities.board import Square
+from ..entities.characters import Party
+from ..entities.pawn import Pawn
+from .location import Point
+
+
+VERSION = 1
+
+
+class ReplayDiverged(ValueError):
+    'the game stopped matching its recording'
+
+
+def _class_path(cls: type) -> str:
+    return f"{cls.__module__}:{cls.__qualname__}"
+
+
+def _load_class(path: str) -> type:
+    module, _, name = path.partition(':')
+    obj: Any = importlib.import_module(module)
+    for part in name.split('.'):
+        obj = getattr(obj, part)
+    return obj
+
+
+def _seed(seed: int, turn: int, phase: str) -> None:
+    random.seed(f"{seed}:{turn}:{phase}")
+
+
+def state_checksum(level) -> int:
+    'a CRC of the positions, health, cooldowns, effects and terrain hazards of a level'
+    state = [level.turn_count]
+    for pawn in (*level.party, level.boss):
+        state.append((pawn.position.x, pawn.position.y, pawn.facing_direction.x, pawn.facing_direction.y,
+                      pawn.health, sorted(pawn._ability_cooldowns.items()),
+                      [(effect.name, effect.duration) for effect in pawn.effects._effects]))
+    state.append([tuple(point) for point in level.board.dangerous_points])
+    return zlib.crc32(repr(state).encode('utf8'))
+
+
+########################
+# ~~ Argument codec ~~ #
+########################
+
+def _encode(value, pawns: list[Pawn]):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, Pawn):
+        return {'pawn': next(i for i, pawn in enumerate(pawns) if pawn is value)}
+    if isinstance(value, Party):
+        return {'party': True}
+    if isinstance(value, Point):
+        return {'point': [value.x, value.y]}
+    if isinstance(value, Square):
+        return {'square': [value.position.x, value.position.y]}
+    if isinstance(value, (tuple, list)):
+        return {'tuple' if isinstance(value, tuple) else 'list': [_encode(v, pawns) for v in value]}
+    raise TypeError(f"Can't record an argument of type {type(value).__name__}")
+
+
+def _decode(value, level, pawns: list[Pawn]):
+    if not isinstance(value, dict):
+        return value
+    if 'pawn' in value:
+        return pawns[value['pawn']]
+    if 'party' in value:
+        return level.party
+    if 'point' in value:
+        return Point(*value['point'])
+    if 'square' in value:
+        return level.board.at(tuple(value['square']))
+    if 'tuple' in value:
+        return tuple(_decode(v, level, pawns) for v in value['tuple'])
+    return [_decode(v, level, pawns) for v in value['list']]
+
+
+class _InputLog:
+    'shared by the party members; `_record_input` in `entities.pawn` writes to it'
+
+    def __init__(self, pawns: list[Pawn]) -> None:
+        self.pawns = pawns
+        self.active = False
+        self.depth = 0
+        self.calls: list[list] = []
+
+    def record(self, pawn: Pawn, name: str, args: tuple, kwargs: dict) -> None:
+        index = next(i for i, p in enumerate(self.pawns) if p is pawn)
+        try:
+            call = [index, name, [_encode(arg, self.pawns) for arg in args]]
+            if kwargs:
+                call.append({key: _encode(value, self.pawns) for key, value in kwargs.items()})
+        except TypeError as error:
+            # never break the party's turn over a recording: keep a marker the replay skips (and
+            # the checksums will then report where the game stopped matching)
+            call = [index, name, {'unrecordable': str(error)}]
+        self.calls.append(call)
+
+
+class InputRecorder:
+    '''
+    Records the seed, the level, and every call the party makes each turn.
+
+    `new_level` seeds the RNG, creates the level and starts recording; the level
+    calls back into the recorder around every player turn.
+    '''
+
+    def __init__(self, seed: Union[int, None] = None, checksum_every: int = 10) -> None:
+        if checksum_every < 1:
+            raise ValueError("checksum_every must be at least 1")
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.checksum_every = checksum_every
+        self.spec: dict[str, Any] = {}
+        self.turns: dict[int, list[list]] = {}
+        self.checksums: dict[int, int] = {}
+        self.final_turn = 0
+        self._log: Union[_InputLog, None] = None
+        self._level = None
+
+    def new_level(self, level_cls: type, party, boss, board=None, **kwargs):
+        '''
+        Create and return `level_cls(party=party, boss=boss, **kwargs)` (with `board`
+        too, for levels that take one) after seeding the RNG.
+        '''
+        from .map_format import MapTemplate
+
+        self.spec = {
+            'level': _class_path(level_cls),
+            'map': base64.b64encode(MapTemplate.from_board(board).to_bytes()).decode('ascii') if board is not None else None,
+            'boss': _class_path(type(boss)),
+            'party': [[_class_path(type(member)), member.name] for member in party],
+        }
+        random.seed(self.seed)
+        if board is not None:
+            kwargs['board'] = board
+        level = level_cls(party=party, boss=boss, **kwargs)
+        self.attach(level)
+        return level
+
+    def attach(self, level) -> None:
+        # calls come from the party; arguments can refer to the party or the boss
+        self._log = _InputLog([*level.party, level.boss])
+        for pawn in level.party:
+            pawn._inputs = self._log
+        level.input_recorder = self
+        self._level = level
+
+    def _begin_player_turn(self, level) -> None:
+        turn = level.turn_count
+        self.final_turn = turn
+        if turn % self.checksum_every == 0:
+            self.checksums[turn] = state_checksum(level)
+        _seed(self.seed, turn, 'player')
+        # kept as they're made, in case the party's code stops iterating this turn
+        self.turns[turn] = self._log.calls = []  # type: ignore[union-attr]
+        self._log.active = True  # type: ignore[union-attr]
+
+    def _end_player_turn(self, level) -> None:
+        self._log.active = False  # type: ignore[union-attr]
+        _seed(self.seed, level.turn_count, 'engine')
+
+    @property
+    def finished(self) -> bool:
+        'whether the recorded game was played to the end'
+        level = self._level
+        return level is not None and not (level.party.is_alive and level.boss.is_alive)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            'version': VERSION,
+            'seed': self.seed,
+            **self.spec,
+            'checksum_every': self.checksum_every,
+            'final_turn': self.final_turn,
+            'finished': self.finished,
+            'turns': {str(turn): calls for turn, calls in self.turns.items() if calls},
+            'checksums': {str(turn): checksum for turn, checksum in self.checksums.items()},
+        }
+
+    def save(self, path: str) -> None:
+        'write the replay as JSON, gzipped if `path` ends with .gz'
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'wt', encoding='utf8') as file:
+            json.dump(self.to_dict(), file, separators=(',', ':'))
+
+
+class _Replayer:
+    'stands in for the InputRecorder while a replay runs: same reseeding, plus checks'
+
+    def __init__(self, replay: dict[str, Any], verify: bool) -> None:
+        self.seed = replay['seed']
+        self.checksums = {int(turn): checksum for turn, checksum in replay['checksums'].items()}
+        self.verify = verify
+
+    def _begin_player_turn(self, level) -> None:
+        turn = level.turn_count
+        if self.verify and turn in self.checksums and state_checksum(level) != self.checksums[turn]:
+            raise ReplayDiverged(f"The replay diverged from the recording by turn {turn}")
+        _seed(self.seed, turn, 'player')
+
+    def _end_player_turn(self, level) -> None:
+        _seed(self.seed, level.turn_count, 'engine')
+
+
+def load_replay(path: str) -> dict[str, Any]:
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf8') as file:
+        replay = json.load(file)
+    if replay.get('version') != VERSION:
+        raise ValueError(f"Unsupported replay version {replay.get('version')}")
+    return replay
+
+
+def run_replay(replay: Union[str, dict[str, Any]], verify: bool = True):
+    '''
+    Rebuild the recorded level and play it to the end with the recorded calls.
+    Returns the finished level; raises ReplayDiverged if a checksum doesn't match.
+    '''
+    from ..entities.characters import Party
+    from .map_format import MapTemplate
+
+    if isinstance(replay, str):
+        replay = load_replay(replay)
+
+    random.seed(replay['seed'])
+    party = Party(*[_load_class(cls)(name) for cls, name in replay['party']])
+    boss = _load_class(replay['boss'])()
+    kwargs: dict[str, Any] = {'party': party, 'boss': boss, 'show_board': False, 'tick_speed': 0}
+    if replay['map'] is not None:
+        kwargs['board'] = MapTemplate.from_bytes(base64.b64decode(replay['map'])).to_board()
+    level = _load_class(replay['level'])(**kwargs)
+    level.input_recorder = _Replayer(replay, verify)
+
+    pawns = [*level.party, level.boss]
+    turns = replay['turns']
+    for turn in level:
+        for call in turns.get(str(turn), ()):
+            if isinstance(call[2], dict):
+                # an unrecordable call; see `_InputLog.record`
+                continue
+            pawn = pawns[call[0]]
+            args = [_decode(arg, level, pawns) for arg in call[2]]
+            kwargs = {key: _decode(value, level, pawns) for key, value in call[3].items()} if len(call) > 3 else {}
+            if call[1] == 'position':
+                pawn.position = args[0]
+            else:
+                getattr(pawn, call[1])(*args, **kwargs)
+        if turn >= replay['final_turn'] and not replay['finished']:
+            break
+    return level
@@ -0,0 +1,242 @@
+"""
+Step many headless levels in lockstep, in the style of a gym `VectorEnv`:
+
+    envs = VectorLevel([make_fight] * 256, actions=ACTIONS, max_turns=500)
+    observations = envs.reset()
+    while training:
+        observations, rewards, dones, info = envs.step(policy(observations))
+
+Each entry of `makers` is a callable that builds a `Level`. A maker is only
+called once: its level is run up to the first player turn and kept as a
+template, and every level after that (including the automatic reset of a
+finished one) is a `fork()` of the template. So levels made by the same maker
+share its map, gear and class data instead of rebuilding them.
+
+`actions` is the action table. `step` takes an `(n, heroes)` array of indexes
+into it, one column per hero in `party.members` order; each entry of the table
+is None (do nothing) or a callable `action(hero, level)`.
+
+With `workers=k`, the levels are split across `k` subprocesses that step their
+shares in parallel; the makers, actions and `observe` must then be picklable
+(module-level functions).
+
+NumPy is required: `pip install pydungeoncrawl[training]`.
+"""
+import multiprocessing
+import random
+from typing import Any, Callable, Sequence, Union
+
+try:
+    import numpy as np
+except ModuleNotFoundError:
+    np = None
+
+
+# per pawn, party first and the boss last
+_PAWN_FEATURES = 6
+
+
+def observe_pawns(level) -> 'np.ndarray':
+    '''
+    The default observation: for every pawn (the party, then the boss) its
+    position as a fraction of the board, health fraction, facing, and whether
+    it's alive.
+    '''
+    board = level.board
+    width, height = board.width, board.height
+    pawns = (*level.party.members, level.boss)
+    out = np.empty(len(pawns) * _PAWN_FEATURES, dtype=np.float32)
+    for i, pawn in enumerate(pawns):
+        position, facing = pawn.position, pawn.facing_direction
+        out[i * _PAWN_FEATURES:(i + 1) * _PAWN_FEATURES] = (
+            position.x / width, position.y / height, pawn.health / pawn.health_max,
+            facing.x, facing.y, pawn.is_alive)
+    return out
+
+
+def _health(level) -> tuple[int, int]:
+    return level.boss.health, sum(member.health for member in level.party.members)
+
+
+class VectorLevel:
+    '''
+    `n = len(makers)` headless levels stepped together.
+
+    `reset()` returns the first observations, an `(n, size)` float32 array.
+    `step(actions)` plays one turn of every level and returns
+    `(observations, rewards, dones, info)`. A level that finished this step (one
+    side died, or it reached `max_turns`) is replaced by a fresh one right away:
+    its row of `observations` is the new level's, and the last observation of
+    the finished one is in `info['final_observation']`. `info` also has
+    `'won'` (the boss died while the party lived) and `'turns'` (the turn each
+    level was on before any reset).
+
+    The reward is the fraction of the boss's health taken off this turn minus
+    the fraction of the party's, plus 1 for a win and minus 1 for a loss;
+    override `reward` to change it.
+    '''
+
+    def __init__(self, makers: Sequence[Callable[[], Any]], actions: Sequence[Union[Callable[[Any, Any], Any], None]],
+                 observe: Callable[[Any], Any] = observe_pawns, max_turns: Union[int, None] = None,
+                 workers: int = 0, seed: Union[int, None] = None) -> None:
+        if np is None:
+            raise ModuleNotFoundError("VectorLevel needs NumPy: pip install pydungeoncrawl[training]")
+        if not makers:
+            raise ValueError("VectorLevel needs at least one level")
+        if workers < 0:
+            raise ValueError("workers can't be negative")
+        self.makers = list(makers)
+        self.actions = tuple(actions)
+        self.observe = observe
+        self.max_turns = max_turns
+        self.seed = seed
+        self.levels: list[Any] = []
+        self._templates: dict[Callable[[], Any], Any] = {}
+        self._health: list[tuple[int, int]] = []
+        self._connections: list[Any] = []
+        self._processes: list[Any] = []
+        if seed is not None and not workers:
+            random.seed(seed)
+        if workers:
+            self._start_workers(min(workers, len(self.makers)))
+
+    def __len__(self) -> int:
+        return len(self.makers)
+
+    def reward(self, level, boss_lost: int, party_lost: int) -> float:
+        'the reward for one turn of `level`, given how much health each side lost'
+        party_max = sum(member.health_max for member in level.party.members)
+        reward = boss_lost / level.boss.health_max - party_lost / party_max
+        if not level.boss.is_alive and level.party.is_alive:
+            reward += 1
+        elif not level.party.is_alive:
+            reward -= 1
+        return reward
+
+    def _new_level(self, index: int):
+        maker = self.makers[index]
+        template = self._templates.get(maker)
+        if template is None:
+            template = self._templates[maker] = maker()
+            template.show_board = False
+            template.tick_speed = 0
+            # forks of the template start at its first player turn
+            template._engine_turn(template.profile.clock(), render=False)
+        return template.fork()
+
+    def reset(self) -> 'np.ndarray':
+        'start every level over; returns the first observations'
+        if self._connections:
+            for connection in self._connections:
+                connection.send(('reset', None))
+            return np.concatenate([connection.recv() for connection in self._connections])
+        self.levels = [self._new_level(i) for i in range(len(self.makers))]
+        self._health = [_health(level) for level in self.levels]
+        return np.stack([self.observe(level) for level in self.levels])
+
+    def step(self, actions: Any) -> tuple['np.ndarray', 'np.ndarray', 'np.ndarray', dict[str, 'np.ndarray']]:
+        actions = np.asarray(actions)
+        if actions.ndim != 2 or actions.shape[0] != len(self.makers):
+            raise ValueError(f"Expected an action array of shape ({len(self.makers)}, heroes), got {actions.shape}")
+        if self._connections:
+            return self._step_workers(actions)
+        if not self.levels:
+            raise RuntimeError("VectorLevel.reset() must be called before VectorLevel.step()")
+
+        n = len(self.levels)
+        table, observe, max_turns = self.actions, self.observe, self.max_turns
+        observations: list[Any] = [None] * n
+        final: list[Any] = [None] * n
+        rewards = np.zeros(n, dtype=np.float32)
+        dones = np.zeros(n, dtype=bool)
+        won = np.zeros(n, dtype=bool)
+        turns = np.zeros(n, dtype=np.int64)
+        for i, level in enumerate(self.levels):
+            for hero, choice in zip(level.party.members, actions[i]):
+                action = table[choice]
+                if action is not None:
+                    action(hero, level)
+            going = level.step()
+
+            boss_before, party_before = self._health[i]
+            boss_after, party_after = _health(level)
+            rewards[i] = self.reward(level, boss_before - boss_after, party_before - party_after)
+            turns[i] = level.turn_count
+            if not going or (max_turns is not None and level.turn_count >= max_turns):
+                dones[i] = True
+                won[i] = not level.boss.is_alive and level.party.is_alive
+                final[i] = observe(level)
+                level = self.levels[i] = self._new_level(i)
+                boss_after, party_after = _health(level)
+            self._health[i] = (boss_after, party_after)
+            observations[i] = observe(level)
+
+        stacked = np.stack(observations)
+        final_observation = np.zeros_like(stacked)
+        for i, row in enumerate(final):
+            if row is not None:
+                final_observation[i] = row
+        return stacked, rewards, dones, {'final_observation': final_observation, 'won': won, 'turns': turns}
+
+    ##################
+    # ~~ Sharding ~~ #
+    ##################
+
+    def _start_workers(self, workers: int) -> None:
+        shards = np.array_split(np.arange(len(self.makers)), workers)
+        for k, shard in enumerate(shards):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_work, name=f'pydungeoncrawl-vector-{k}', daemon=True,
+                args=(child, type(self), [self.makers[i] for i in shard], self.actions, self.observe,
+                      self.max_turns, None if self.seed is None else f"{self.seed}:{k}"))
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+        self._shards = [len(shard) for shard in shards]
+
+    def _step_workers(self, actions: 'np.ndarray'):
+        start = 0
+        for connection, size in zip(self._connections, self._shards):
+            connection.send(('step', actions[start:start + size]))
+            start += size
+        results = [connection.recv() for connection in self._connections]
+        observations, rewards, dones, infos = zip(*results)
+        info = {key: np.concatenate([part[key] for part in infos]) for key in infos[0]}
+        return np.concatenate(observations), np.concatenate(rewards), np.concatenate(dones), info
+
+    def close(self) -> None:
+        'stop the worker processes, if there are any'
+        for connection in self._connections:
+            try:
+                connection.send(('close', None))
+            except (BrokenPipeError, OSError):
+                pass
+            connection.close()
+        for process in self._processes:
+            process.join(timeout=5)
+        self._connections, self._processes = [], []
+
+    def __enter__(self) -> 'VectorLevel':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _work(connection, cls: type, makers: list, actions: tuple, observe: Callable, max_turns: Union[int, None],
+          seed: Union[str, None]) -> None:
+    'a worker process: steps its share of the levels in-process'
+    # forked workers would otherwise all share the parent's RNG state
+    random.seed(seed)
+    envs = cls(makers, actions, observe=observe, max_turns=max_turns)
+    while True:
+        command, payload = connection.recv()
+        if command == 'reset':
+            connection.send(envs.reset())
+        elif command == 'step':
+            connection.send(envs.step(payload))
+        else:
+            break
+    connection.close()